@@ -21,7 +21,7 @@ def upload(item):
 
 
 from collections import deque
-from threading import Lock
+from threading import Lock, Thread
 
 # 가장 먼저 필요한 기능은 파이프라인의 단계마다 작업을 전달할 방법이다. 스레드 안전한 생산자-소비자를 이용해 이를 모델링 할 수 있다.
 class MyQueue:
@@ -0,0 +1,1093 @@
+# ======================================================================================================================
+# 생명 게임 Grid의 표현 방식을 바꿔 simulate를 빠르게 만들어라.
+# better way 56~60의 생명 게임 예제는 동시성 도구를 비교하기 위한 것이라 Grid 자체의 성능은 신경쓰지 않았다.
+# Grid.rows는 셀마다 '*' 또는 '-' 문자열 참조를 하나씩 저장하고, count_neighbors는 셀마다 get()을 8번 호출하며
+# get()은 호출될 때마다 나머지 연산을 두 번 수행한다. 4096x4096 보드라면 한 세대를 계산하는데 수 분이 걸린다.
+
+# 이 파일의 Grid 변형들은 모두 기존 Grid와 같은 get/set/__str__ API를 제공한다. 따라서 ColumnPrinter 처럼 str(grid)만 사용하는
+# 코드는 그대로 동작한다. simulate는 functools.singledispatch로 정의해서 Grid 종류에 맞는 구현을 골라 호출하게 만든다.
+# 이 파일은 임포트해도 아무것도 실행하지 않으므로 다른 파일에서 Grid 변형을 가져다 쓸 수 있다.
+# ======================================================================================================================
+from array import array
+from collections import OrderedDict
+from functools import lru_cache, partial, singledispatch
+import random
+import re
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy가 없어도 기존 Grid는 사용할 수 있다
+    np = None
+
+ALIVE = '*'
+EMPTY = '-'
+
+
+class Grid:
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.rows = []
+        for _ in range(self.height):
+            self.rows.append([EMPTY] * self.width)
+
+    def get(self, y, x):
+        return self.rows[y % self.height][x % self.width]
+
+    def set(self, y, x, state):
+        self.rows[y % self.height][x % self.width] = state
+
+    def __str__(self):
+        output = ''
+        for row in self.rows:
+            for cell in row:
+                output += cell
+            output += '\n'
+        return output
+
+
+def count_neighbors(y, x, get):
+    n_ = get(y - 1, x + 0) # 북(N)
+    ne = get(y - 1, x + 1) # 북동(NE)
+    e_ = get(y + 0, x + 1) # 동(E)
+    se = get(y + 1, x + 1) # 남동(SE)
+    s_ = get(y + 1, x + 0) # 남(S)
+    sw = get(y + 1, x - 1) # 남서(SW)
+    w_ = get(y + 0, x - 1) # 서(W)
+    nw = get(y - 1, x - 1) # 북서(NW)
+    neighbor_states = [n_, ne, e_, se, s_, sw, w_, nw]
+    count = 0
+    for state in neighbor_states:
+        if state == ALIVE:
+            count += 1
+    return count
+
+
+def game_logic(state, neighbors):
+    if state == ALIVE:
+        if neighbors < 2:
+            return EMPTY # 살아 있는 이웃이 너무 적음: 죽음
+        elif neighbors > 3:
+            return EMPTY # 살아 있는 이웃이 너무 많음: 죽음
+    else:
+        if neighbors == 3:
+            return ALIVE # 다시 생성됨
+    return state
+
+
+# logic에 game_logic과 같은 형태의 다른 함수를 넘기면 규칙을 바꾸거나 I/O를 흉내 낼 수 있다.
+def step_cell(y, x, get, set, logic=game_logic):
+    state = get(y, x)
+    neighbors = count_neighbors(y, x, get)
+    next_state = logic(state, neighbors)
+    set(y, x, next_state)
+
+
+# 기존 simulate와 똑같이 동작한다. 다른 Grid 종류는 simulate.register로 자신만의 구현을 등록한다.
+@singledispatch
+def simulate(grid, logic=game_logic):
+    next_grid = Grid(grid.height, grid.width)
+    for y in range(grid.height):
+        for x in range(grid.width):
+            step_cell(y, x, grid.get, next_grid.set, logic)
+    return next_grid
+
+
+class ColumnPrinter:
+    def __init__(self):
+        self.columns = []
+
+    def append(self, data):
+        self.columns.append(data)
+
+    def __str__(self):
+        row_count = 1
+        for data in self.columns:
+            row_count = max(
+                row_count, len(data.splitlines()) + 1)
+
+        rows = [''] * row_count
+        for j in range(row_count):
+            for i, data in enumerate(self.columns):
+                line = data.splitlines()[max(0, j - 1)]
+                if j == 0:
+                    padding = ' ' * (len(line) // 2)
+                    rows[j] += padding + str(i) + padding
+                else:
+                    rows[j] += line
+
+                if (i + 1) < len(self.columns):
+                    rows[j] += ' | '
+
+        return '\n'.join(rows)
+
+
+def make_glider(grid):
+    grid.set(0, 3, ALIVE)
+    grid.set(1, 4, ALIVE)
+    grid.set(2, 2, ALIVE)
+    grid.set(2, 3, ALIVE)
+    grid.set(2, 4, ALIVE)
+    return grid
+
+# ======================================================================================================================
+# numpy 배열로 보드 전체를 한 번에 계산하라
+# 셀 하나마다 파이썬 함수를 여러 번 호출하는 대신, 보드를 numpy의 uint8 배열(살아있으면 1, 비어 있으면 0)로 저장하면
+# 이웃 수를 보드 전체에 대해 한 번에 계산할 수 있다. np.roll은 배열을 밀면서 반대편 끝으로 넘어간 값을 다시 앞으로 가져오므로
+# Grid.get의 나머지 연산과 똑같은 토러스(toroidal) 형태의 경계 처리를 해준다.
+class NumPyGrid:
+    def __init__(self, height, width):
+        if np is None:
+            raise ImportError('NumPyGrid를 사용하려면 numpy가 필요합니다')
+        self.height = height
+        self.width = width
+        self.cells = np.zeros((height, width), dtype=np.uint8)
+
+    def get(self, y, x):
+        if self.cells[y % self.height, x % self.width]:
+            return ALIVE
+        return EMPTY
+
+    def set(self, y, x, state):
+        self.cells[y % self.height, x % self.width] = state == ALIVE
+
+    # 셀마다 += 를 하는 대신 행 단위로 문자열을 만들어 join 한다.
+    def __str__(self):
+        symbols = np.array([EMPTY, ALIVE])
+        output = []
+        for row in symbols[self.cells]:
+            output.append(''.join(row))
+            output.append('\n')
+        return ''.join(output)
+
+
+# 위아래로 민 배열을 더해 세로 방향 합을 먼저 구하고, 그 결과를 좌우로 밀어 더하면 3x3 합이 된다.
+# 마지막에 자기 자신을 빼면 8방향 이웃 수가 남는다. np.roll 8번 대신 4번만 호출하면 된다.
+def count_neighbors_numpy(cells):
+    vertical = cells + np.roll(cells, 1, axis=0) + np.roll(cells, -1, axis=0)
+    total = vertical + np.roll(vertical, 1, axis=1) + np.roll(vertical, -1, axis=1)
+    return total - cells
+
+
+# game_logic의 if 문을 불리언 배열 연산으로 옮긴 것이다.
+# 살아 있는 셀은 이웃이 2개나 3개일 때 살아남고, 빈 셀은 이웃이 정확히 3개일 때 살아난다.
+def game_logic_numpy(cells, neighbors):
+    born = neighbors == 3
+    survive = (cells == 1) & (neighbors == 2)
+    return (born | survive).astype(np.uint8)
+
+
+# 다른 규칙은 (현재 상태, 이웃 수)로 인덱싱하는 2x9 룩업 테이블 배열을 만들어 팬시 인덱싱(fancy indexing)으로 적용한다.
+def rule_table_numpy(logic):
+    births, survivals = rule_sets(logic)
+    table = np.zeros((2, 9), dtype=np.uint8)
+    table[0, sorted(births)] = 1
+    table[1, sorted(survivals)] = 1
+    return table
+
+
+@simulate.register(NumPyGrid)
+def simulate_numpy(grid, logic=game_logic):
+    next_grid = NumPyGrid(grid.height, grid.width)
+    neighbors = count_neighbors_numpy(grid.cells)
+    if logic is game_logic:
+        next_grid.cells = game_logic_numpy(grid.cells, neighbors)
+    else:
+        next_grid.cells = rule_table_numpy(logic)[grid.cells, neighbors]
+    return next_grid
+
+
+def use_numpy_grid():
+    grid = make_glider(NumPyGrid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid = simulate(grid)  # simulate_numpy가 호출된다
+
+    print(columns)
+
+
+# 두 구현이 같은 결과를 내는지 확인하고 걸린 시간을 비교한다.
+def compare_numpy_grid(height=256, width=256, generations=5):
+    grid = make_glider(Grid(height, width))
+    numpy_grid = make_glider(NumPyGrid(height, width))
+
+    start = time.perf_counter()
+    for _ in range(generations):
+        grid = simulate(grid)
+    list_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(generations):
+        numpy_grid = simulate(numpy_grid)
+    numpy_time = time.perf_counter() - start
+
+    assert str(grid) == str(numpy_grid)
+    print(f'{height}x{width} 보드 {generations} 세대: '
+          f'Grid {list_time:.3f}초, NumPyGrid {numpy_time:.4f}초 '
+          f'({list_time / numpy_time:.0f}배 빠름)')
+
+# ======================================================================================================================
+# 비트 단위로 보드를 압축하라
+# Grid.rows는 셀마다 문자열 객체에 대한 참조(8바이트)를 저장하므로 10k x 10k 보드는 일을 시작하기도 전에 1GB 가까이 사용한다.
+# 파이썬 int는 크기 제한이 없으므로 한 행 전체를 하나의 int 비트보드로 표현할 수 있다. x 번째 비트가 1이면 (y, x) 셀이 살아있다.
+# 이렇게 하면 10k x 10k 보드가 약 13MB로 줄어든다.
+
+# 다음 세대는 셀마다 함수를 호출하는 대신 행 전체에 대한 비트 연산으로 계산한다. 이웃 8개의 비트를 전가산기(full adder)로 더해서
+# 이웃 수를 비트 평면(bit plane) 몇 개로 나눠 표현하는 고전적인 비트 슬라이스(bit-sliced) 덧셈 방식이다.
+# CPython의 int는 내부적으로 30비트 단위(digit)로 저장되므로 머신 워드 하나에 64셀이 들어가진 않지만, 한 번의 비트 연산이
+# C 루프 안에서 행 전체에 대해 수행된다는 점은 같다.
+class PackedGrid:
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.rows = [0] * height
+
+    def get(self, y, x):
+        if (self.rows[y % self.height] >> (x % self.width)) & 1:
+            return ALIVE
+        return EMPTY
+
+    def set(self, y, x, state):
+        bit = 1 << (x % self.width)
+        if state == ALIVE:
+            self.rows[y % self.height] |= bit
+        else:
+            self.rows[y % self.height] &= ~bit
+
+    # bin 문자열은 최상위 비트부터 나오므로 뒤집어서 x = 0 셀이 맨 앞에 오게 한다.
+    def __str__(self):
+        table = str.maketrans('01', EMPTY + ALIVE)
+        output = []
+        for row in self.rows:
+            bits = format(row, f'0{self.width}b')
+            output.append(bits[::-1].translate(table))
+            output.append('\n')
+        return ''.join(output)
+
+
+# 서쪽 이웃 비트가 x 위치로 오도록 왼쪽으로 회전한다. 넘친 최상위 비트는 0번 비트로 돌아온다(토러스 경계).
+def rotate_west(row, width, mask):
+    return ((row << 1) | (row >> (width - 1))) & mask
+
+
+# 동쪽 이웃 비트가 x 위치로 오도록 오른쪽으로 회전한다. 0번 비트는 최상위 비트로 돌아간다.
+def rotate_east(row, width):
+    return (row >> 1) | ((row & 1) << (width - 1))
+
+
+def full_adder(a, b, c):
+    total = a ^ b ^ c
+    carry = (a & b) | (a & c) | (b & c)
+    return total, carry
+
+
+# 이웃 수의 1의 자리(ones)와 2의 자리(twos), 4 이상 여부(fours)를 비트 평면으로 구한다.
+# 다음 세대에 살아있으려면 이웃이 2개나 3개여야 하므로 twos가 켜져 있고 fours가 꺼져 있어야 한다.
+# 이웃이 3개면(ones도 켜짐) 무조건 살고, 2개면 현재 살아있는 셀만 살아남는다.
+def step_packed_row(above, row, below, width, mask):
+    top, top_carry = full_adder(
+        rotate_west(above, width, mask), above, rotate_east(above, width))
+    bottom, bottom_carry = full_adder(
+        rotate_west(below, width, mask), below, rotate_east(below, width))
+    west = rotate_west(row, width, mask)
+    east = rotate_east(row, width)
+    middle = west ^ east
+    middle_carry = west & east
+
+    ones, ones_carry = full_adder(top, middle, bottom)
+    twos, fours = full_adder(top_carry, middle_carry, bottom_carry)
+    fours |= twos & ones_carry
+    twos ^= ones_carry
+    return twos & ~fours & (ones | row) & mask
+
+
+# 다른 규칙에서는 이웃 수 0~8을 모두 구분해야 하므로 8의 자리(eights)까지 비트 평면 네 개를 만든다.
+def neighbor_planes(above, row, below, width, mask):
+    top, top_carry = full_adder(
+        rotate_west(above, width, mask), above, rotate_east(above, width))
+    bottom, bottom_carry = full_adder(
+        rotate_west(below, width, mask), below, rotate_east(below, width))
+    west = rotate_west(row, width, mask)
+    east = rotate_east(row, width)
+
+    ones, ones_carry = full_adder(top, west ^ east, bottom)
+    twos, fours = full_adder(top_carry, west & east, bottom_carry)
+    eights = fours & twos & ones_carry
+    fours ^= twos & ones_carry
+    twos ^= ones_carry
+    return ones, twos, fours, eights
+
+
+# 비트 평면에서 이웃 수가 정확히 count인 셀의 비트만 켠 마스크를 만든다.
+def count_mask(planes, count, mask):
+    result = mask
+    for bit, plane in enumerate(planes):
+        if (count >> bit) & 1:
+            result &= plane
+        else:
+            result &= ~plane
+    return result
+
+
+def step_packed_row_rule(above, row, below, width, mask, births, survivals):
+    planes = neighbor_planes(above, row, below, width, mask)
+    born = 0
+    for count in births:
+        born |= count_mask(planes, count, mask)
+    survive = 0
+    for count in survivals:
+        survive |= count_mask(planes, count, mask)
+    return ((born & ~row) | (survive & row)) & mask
+
+
+@simulate.register(PackedGrid)
+def simulate_packed(grid, logic=game_logic):
+    next_grid = PackedGrid(grid.height, grid.width)
+    rows = grid.rows
+    height = grid.height
+    if logic is game_logic:
+        for y in range(height):
+            next_grid.rows[y] = step_packed_row(
+                rows[y - 1], rows[y], rows[(y + 1) % height],
+                grid.width, grid.mask)
+    else:
+        births, survivals = rule_sets(logic)
+        for y in range(height):
+            next_grid.rows[y] = step_packed_row_rule(
+                rows[y - 1], rows[y], rows[(y + 1) % height],
+                grid.width, grid.mask, births, survivals)
+    return next_grid
+
+
+def use_packed_grid():
+    grid = make_glider(PackedGrid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid = simulate(grid)  # simulate_packed가 호출된다
+
+    print(columns)
+
+
+def compare_packed_grid(height=256, width=256, generations=5):
+    grid = make_glider(Grid(height, width))
+    packed_grid = make_glider(PackedGrid(height, width))
+
+    start = time.perf_counter()
+    for _ in range(generations):
+        grid = simulate(grid)
+    list_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(generations):
+        packed_grid = simulate(packed_grid)
+    packed_time = time.perf_counter() - start
+
+    assert str(grid) == str(packed_grid)
+    print(f'{height}x{width} 보드 {generations} 세대: '
+          f'Grid {list_time:.3f}초, PackedGrid {packed_time:.4f}초 '
+          f'({list_time / packed_time:.0f}배 빠름)')
+
+# ======================================================================================================================
+# 보드 대부분이 비어 있다면 살아있는 셀과 그 이웃만 추적하라
+# simulate는 매 세대마다 모든 (y, x)를 방문한다. 하지만 보드의 99% 이상이 EMPTY라면 대부분의 계산은 아무것도 바꾸지 못한다.
+# 다음 세대에 상태가 바뀔 수 있는 셀은 직전 세대에 상태가 바뀐 셀과 그 이웃뿐이다. 따라서 살아있는 셀의 좌표 집합(alive)과
+# 직전 세대에 바뀐 셀의 좌표 집합(changed)만 관리하면 계산량이 보드 넓이가 아니라 변화하는 셀의 수에 비례하게 된다.
+# 좌표는 Grid.get과 같은 방식으로 나머지 연산을 해서 저장하므로 경계를 넘어가면 반대편으로 이어진다.
+class SparseGrid:
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.alive = set()
+        self.changed = set()
+
+    def get(self, y, x):
+        if (y % self.height, x % self.width) in self.alive:
+            return ALIVE
+        return EMPTY
+
+    # 직접 set한 셀도 다음 세대에 다시 계산해야 하므로 changed에 넣는다.
+    def set(self, y, x, state):
+        cell = (y % self.height, x % self.width)
+        if state == ALIVE:
+            self.alive.add(cell)
+        else:
+            self.alive.discard(cell)
+        self.changed.add(cell)
+
+    def neighbors(self, y, x):
+        height = self.height
+        width = self.width
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dy or dx:
+                    yield (y + dy) % height, (x + dx) % width
+
+    def __str__(self):
+        rows = [[EMPTY] * self.width for _ in range(self.height)]
+        for y, x in self.alive:
+            rows[y][x] = ALIVE
+        return ''.join(''.join(row) + '\n' for row in rows)
+
+
+# 이웃이 하나도 없는 빈 셀이 살아나는 규칙(B0)에서는 변화가 없던 곳에서도 셀이 생기므로 이 방식을 쓸 수 없다.
+@simulate.register(SparseGrid)
+def simulate_sparse(grid, logic=game_logic):
+    if logic(EMPTY, 0) == ALIVE:
+        raise ValueError('SparseGrid는 B0 규칙을 지원하지 않습니다')
+    next_grid = SparseGrid(grid.height, grid.width)
+    alive = grid.alive
+    next_grid.alive = set(alive)
+
+    candidates = set()
+    for cell in grid.changed:
+        candidates.add(cell)
+        candidates.update(grid.neighbors(*cell))
+
+    for cell in candidates:
+        state = ALIVE if cell in alive else EMPTY
+        neighbors = 0
+        for neighbor in grid.neighbors(*cell):
+            if neighbor in alive:
+                neighbors += 1
+        next_state = logic(state, neighbors)
+        if next_state != state:
+            if next_state == ALIVE:
+                next_grid.alive.add(cell)
+            else:
+                next_grid.alive.discard(cell)
+            next_grid.changed.add(cell)
+
+    return next_grid
+
+
+def use_sparse_grid():
+    grid = make_glider(SparseGrid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid = simulate(grid)  # simulate_sparse가 호출된다
+
+    print(columns)
+
+
+# 보드 크기를 키워도 글라이더 하나만 있으면 SparseGrid의 세대당 시간은 거의 변하지 않는다.
+def compare_sparse_grid(generations=20):
+    grid = make_glider(Grid(256, 256))
+    start = time.perf_counter()
+    for _ in range(generations):
+        grid = simulate(grid)
+    list_time = time.perf_counter() - start
+    print(f'256x256 Grid {generations} 세대: {list_time:.3f}초')
+
+    for size in (256, 4096, 65536):
+        sparse_grid = make_glider(SparseGrid(size, size))
+        start = time.perf_counter()
+        for _ in range(generations):
+            sparse_grid = simulate(sparse_grid)
+        sparse_time = time.perf_counter() - start
+        print(f'{size}x{size} SparseGrid {generations} 세대: {sparse_time:.4f}초')
+
+# ======================================================================================================================
+# 세대마다 새 Grid를 만들지 말고 버퍼 두 개를 번갈아 사용하라
+# 모든 simulate는 next_grid = Grid(grid.height, grid.width)로 시작하므로 세대마다 height개의 리스트를 새로 할당하고 버린다.
+# 보드가 크면 할당과 해제에 드는 시간이 적지 않다. DoubleBufferedGrid는 현재 세대(rows)와 다음 세대(back_rows) 버퍼를
+# 미리 만들어 두고, 한 세대를 계산하면 두 버퍼를 맞바꾼다. 다음 세대 버퍼는 모든 셀이 다시 쓰이므로 지울 필요가 없다.
+class DoubleBufferedGrid(Grid):
+    def __init__(self, height, width):
+        super().__init__(height, width)
+        self.back_rows = []
+        for _ in range(self.height):
+            self.back_rows.append([EMPTY] * self.width)
+
+    def set_next(self, y, x, state):
+        self.back_rows[y % self.height][x % self.width] = state
+
+    def swap(self):
+        self.rows, self.back_rows = self.back_rows, self.rows
+
+
+# Simulation은 DoubleBufferedGrid 하나를 소유하고 제자리에서 세대를 진행한다.
+# 일반 Grid를 넘기면 내용을 한 번 복사해서 DoubleBufferedGrid로 바꾼다.
+# DoubleBufferedGrid는 Grid의 하위 클래스이므로 simulate(grid)도 그대로 쓸 수 있다. 이때는 기존 simulate가 넘겨받은 grid를
+# 바꾸지 않고 버퍼가 하나뿐인 새 Grid를 반환한다.
+class Simulation:
+    def __init__(self, grid, logic=game_logic):
+        if not isinstance(grid, DoubleBufferedGrid):
+            buffered = DoubleBufferedGrid(grid.height, grid.width)
+            for y in range(grid.height):
+                for x in range(grid.width):
+                    buffered.set(y, x, grid.get(y, x))
+            grid = buffered
+        self.grid = grid
+        self.logic = logic
+        self.generation = 0
+
+    def step(self):
+        grid = self.grid
+        for y in range(grid.height):
+            for x in range(grid.width):
+                step_cell(y, x, grid.get, grid.set_next, self.logic)
+        grid.swap()
+        self.generation += 1
+        return grid
+
+    def run(self, generations):
+        for _ in range(generations):
+            self.step()
+        return self.grid
+
+
+def use_simulation():
+    simulation = Simulation(make_glider(DoubleBufferedGrid(5, 9)))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(simulation.grid))
+        simulation.step()
+
+    print(columns)
+
+
+# 세대마다 걸린 시간과 가비지 컬렉터가 실행된 횟수를 비교하고, tracemalloc으로 한 세대를 진행할 때 할당되는 메모리의
+# 최댓값을 잰다. (better way 81 참조) tracemalloc은 실행 속도를 크게 떨어뜨리므로 시간을 잴 때는 끈다.
+def measure_generations(step, generations):
+    import gc
+    import tracemalloc
+
+    collections = sum(stat['collections'] for stat in gc.get_stats())
+    start = time.perf_counter()
+    for _ in range(generations):
+        step()
+    delta = time.perf_counter() - start
+    collections = sum(stat['collections'] for stat in gc.get_stats()) - collections
+
+    tracemalloc.start()
+    step()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return delta, collections, peak
+
+
+def compare_simulation(height=128, width=128, generations=20):
+    grid = make_glider(Grid(height, width))
+
+    def step_grid():
+        nonlocal grid
+        grid = simulate(grid)
+
+    simulation = Simulation(make_glider(DoubleBufferedGrid(height, width)))
+
+    print(f'{height}x{width} 보드 {generations} 세대')
+    for name, step in [('매 세대 새 Grid 할당', step_grid),
+                       ('이중 버퍼 Simulation', simulation.step)]:
+        delta, collections, peak = measure_generations(step, generations)
+        print(f'{name}: {delta:.3f}초, GC {collections}번, '
+              f'세대당 최대 할당 {peak / 1024:,.1f}KB')
+
+    assert str(grid) == str(simulation.grid)
+# ======================================================================================================================
+# 같은 보드가 다시 나타나면 시뮬레이션을 일찍 끝내라
+# 고정된 세대 수만큼 simulate를 돌리다 보면 보드가 수천 세대 전에 이미 고정된 모양(still life)이나 주기가 2인 진동자(oscillator)가
+# 됐는데도 계속 같은 계산을 반복하게 된다. 생명 게임은 결정적(deterministic)이므로 같은 보드가 다시 나타나면 그 뒤로는 똑같이 반복된다.
+
+# 세대마다 보드 전체를 해시하면 셀 수에 비례하는 비용이 든다. 대신 셀마다 무작위 64비트 키를 정해두고 살아 있는 셀의 키를 모두
+# XOR한 값을 지문(fingerprint)으로 사용하면(조브리스트 해싱, Zobrist hashing) 상태가 바뀐 셀의 키만 XOR해서 지문을 갱신할 수 있다.
+# 지문은 history 크기로 제한한 OrderedDict에 세대 번호와 함께 저장한다. 주기가 history보다 길면 찾지 못한다.
+# 서로 다른 보드의 지문이 같을 확률은 2^-64 수준이라 무시한다.
+class CycleDetectingSimulation(Simulation):
+    def __init__(self, grid, logic=game_logic, history=1024):
+        super().__init__(grid, logic)
+        grid = self.grid
+        self.keys = []
+        for _ in range(grid.height):
+            self.keys.append([random.getrandbits(64) for _ in range(grid.width)])
+
+        self.fingerprint = 0
+        for y in range(grid.height):
+            for x in range(grid.width):
+                if grid.rows[y][x] == ALIVE:
+                    self.fingerprint ^= self.keys[y][x]
+
+        self.history_size = history
+        self.history = OrderedDict()
+        self.history[self.fingerprint] = self.generation
+        self.cycle_start = None  # 처음으로 다시 나타난 보드의 세대
+        self.period = None
+
+    def step(self):
+        grid = self.grid
+        keys = self.keys
+        fingerprint = self.fingerprint
+        logic = self.logic
+        for y in range(grid.height):
+            row = grid.rows[y]
+            back_row = grid.back_rows[y]
+            key_row = keys[y]
+            for x in range(grid.width):
+                step_cell(y, x, grid.get, grid.set_next, logic)
+                if back_row[x] != row[x]:
+                    fingerprint ^= key_row[x]
+        grid.swap()
+        self.generation += 1
+        self.fingerprint = fingerprint
+        return grid
+
+    def remember(self):
+        self.history[self.fingerprint] = self.generation
+        if len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+
+    # 반복을 찾으면 fast_forward가 False일 때는 바로 멈추고, True일 때는 남은 세대 수를 주기로 나눈 나머지만큼만 진행한다.
+    # 어느 쪽이든 cycle_start와 period에 결과가 남는다.
+    def run(self, generations, fast_forward=True):
+        target = self.generation + generations
+        while self.generation < target:
+            self.step()
+            seen = self.history.get(self.fingerprint)
+            if seen is None:
+                self.remember()
+                continue
+
+            self.cycle_start = seen
+            self.period = self.generation - seen
+            if fast_forward:
+                for _ in range((target - self.generation) % self.period):
+                    self.step()
+                self.generation = target
+            # 건너뛴 뒤에는 history의 세대 번호가 맞지 않으므로 현재 보드부터 다시 기록한다
+            self.history.clear()
+            self.history[self.fingerprint] = self.generation
+            break
+
+        return self.grid
+
+
+def use_cycle_detection():
+    blinker = DoubleBufferedGrid(5, 5)
+    for x in (1, 2, 3):
+        blinker.set(2, x, ALIVE)
+
+    block = DoubleBufferedGrid(4, 4)
+    for y, x in ((1, 1), (1, 2), (2, 1), (2, 2)):
+        block.set(y, x, ALIVE)
+
+    glider = make_glider(DoubleBufferedGrid(8, 8))
+
+    for name, grid in (('블링커', blinker), ('블록', block), ('글라이더', glider)):
+        simulation = CycleDetectingSimulation(grid)
+        start = time.perf_counter()
+        simulation.run(10**6)
+        delta = time.perf_counter() - start
+        print(f'{name}: {simulation.cycle_start} 세대부터 주기 {simulation.period}, '
+              f'{simulation.generation:,} 세대까지 {delta:.4f}초')
+
+# ======================================================================================================================
+# 규칙 문자열을 룩업 테이블로 컴파일하라
+# game_logic은 콘웨이의 B3/S23 규칙을 if 문으로 하드코딩하고 셀마다 이 분기를 실행한다. HighLife(B36/S23), Seeds(B2/S),
+# Day & Night(B3678/S34678) 같은 다른 규칙을 쓰려면 함수를 새로 작성해야 한다.
+# compile_rule은 "B36/S23" 같은 규칙 문자열을 (현재 상태, 이웃 수)로 인덱싱하는 테이블로 바꾸고, game_logic과 같은 형태의 함수를 반환한다.
+# 테이블은 기본 인자로 묶어서 지역 변수처럼 빠르게 읽히게 한다. __call__을 정의한 클래스를 쓰면 호출할 때마다 부가 비용이 붙어
+# 오히려 if 문보다 느려진다.
+# 반환된 함수는 모든 simulate 변형의 logic 인자로 넘길 수 있다. NumPyGrid와 PackedGrid처럼 셀마다 함수를 호출하지 않는 변형은
+# 함수에 붙여 둔 births와 survivals로 자신만의 벡터화된 규칙을 만든다.
+RULESTRING = re.compile(r'^B([0-8]*)/S([0-8]*)$', re.IGNORECASE)
+
+
+def parse_rulestring(rulestring):
+    parts = rulestring.strip().split('/')
+    if len(parts) == 2 and parts[0][:1].upper() == 'S':
+        parts.reverse()  # S23/B3 처럼 순서가 바뀐 표기도 받아들인다
+    match = RULESTRING.match('/'.join(parts))
+    if match is None:
+        raise ValueError(f'B/S 형식의 규칙 문자열이 아닙니다: {rulestring!r}')
+    births = frozenset(int(c) for c in match.group(1))
+    survivals = frozenset(int(c) for c in match.group(2))
+    return births, survivals
+
+
+# 중첩 함수는 피클링할 수 없으므로 그대로는 simulate_multiprocess처럼 logic을 자식 프로세스로 보내는 변형에 넘길 수 없다.
+# pickle은 함수를 모듈과 __qualname__으로 저장하므로, 컴파일한 함수의 __qualname__을 'compiled_rules.B36_S23'처럼 이 객체의
+# 속성 경로로 바꿔 둔다. 같은 규칙을 다시 컴파일하면 저장해 둔 함수를 돌려주고, 아직 컴파일하지 않은 프로세스(spawn이나
+# forkserver로 만든 자식 프로세스)에서는 __getattr__이 규칙 문자열을 다시 컴파일한다.
+# functools.partial이나 __call__을 정의한 클래스로 만들어도 피클링할 수 있지만 호출 비용 때문에 if 문보다 느려진다.
+class CompiledRules:
+    def __getattr__(self, name):
+        births, _, survivals = name.partition('_')
+        return compile_rule(f'{births}/{survivals}')
+
+
+compiled_rules = CompiledRules()
+
+
+def compile_rule(rulestring):
+    births, survivals = parse_rulestring(rulestring)
+    key = f'B{"".join(map(str, sorted(births)))}_S{"".join(map(str, sorted(survivals)))}'
+    if key in vars(compiled_rules):
+        return vars(compiled_rules)[key]
+
+    table = {
+        EMPTY: tuple(ALIVE if n in births else EMPTY for n in range(9)),
+        ALIVE: tuple(ALIVE if n in survivals else EMPTY for n in range(9)),
+    }
+
+    def logic(state, neighbors, table=table):
+        return table[state][neighbors]
+
+    logic.__qualname__ = f'compiled_rules.{key}'
+    logic.rulestring = rulestring
+    logic.births = births
+    logic.survivals = survivals
+    setattr(compiled_rules, key, logic)
+    return logic
+
+
+# compile_rule로 만들지 않은 함수라면 가능한 입력 18개를 모두 넣어 보고 규칙을 알아낸다.
+def rule_sets(logic):
+    if hasattr(logic, 'births'):
+        return logic.births, logic.survivals
+    births = frozenset(n for n in range(9) if logic(EMPTY, n) == ALIVE)
+    survivals = frozenset(n for n in range(9) if logic(ALIVE, n) == ALIVE)
+    return births, survivals
+
+
+CONWAY = compile_rule('B3/S23')
+HIGHLIFE = compile_rule('B36/S23')
+SEEDS = compile_rule('B2/S')
+DAY_AND_NIGHT = compile_rule('B3678/S34678')
+
+
+def use_compile_rule():
+    for logic in (CONWAY, HIGHLIFE, SEEDS, DAY_AND_NIGHT):
+        grid = make_glider(Grid(5, 9))
+        columns = ColumnPrinter()
+        for i in range(4):
+            columns.append(str(grid))
+            grid = simulate(grid, logic)
+        print(logic.rulestring)
+        print(columns)
+
+
+# 모든 조합의 입력에 대해 호출 시간을 비교하고, 벡터화된 Grid 변형도 같은 결과를 내는지 확인한다.
+def compare_compile_rule(size=64, generations=10):
+    import timeit
+
+    inputs = [(state, n) for state in (ALIVE, EMPTY) for n in range(9)] * 100
+    for name, logic in (('game_logic', game_logic), ('compile_rule', CONWAY)):
+        delta = timeit.timeit(
+            lambda: [logic(state, n) for state, n in inputs], number=1000)
+        print(f'{name}: {delta:.3f}초')
+
+    for logic in (HIGHLIFE, SEEDS, DAY_AND_NIGHT):
+        grids = [Grid(size, size), PackedGrid(size, size), DoubleBufferedGrid(size, size)]
+        if np is not None:
+            grids.append(NumPyGrid(size, size))
+        for y in range(size):
+            for x in range(size):
+                if random.random() < 0.3:
+                    for grid in grids:
+                        grid.set(y, x, ALIVE)
+        for _ in range(generations):
+            grids = [simulate(grid, logic) for grid in grids]
+        assert len(set(str(grid) for grid in grids)) == 1
+
+# ======================================================================================================================
+# 경계가 없는 평면은 청크 단위로 필요한 곳에만 할당하라
+# Grid.get과 Grid.set은 좌표를 % self.height와 % self.width로 감싸므로 보드는 토러스다. 글라이더는 결국 한 바퀴 돌아와 자기가
+# 남긴 흔적과 부딪히고, 이를 피하려면 패턴보다 훨씬 큰 직사각형을 미리 할당해야 한다.
+# ChunkedGrid는 무한한 평면을 chunk_size x chunk_size 크기의 청크로 나누고, (청크 행, 청크 열)을 키로 하는 딕셔너리에 살아 있는
+# 셀이 있는 청크만 저장한다. 청크는 셀이 생길 때 만들어지고 모든 셀이 죽으면 사라진다. 청크 안의 행은 PackedGrid처럼 int 비트보드다.
+# 다음 세대는 살아 있는 청크와 그 주변 8개 청크만 계산하므로 메모리와 세대당 시간이 좌표 범위가 아니라 패턴이 차지하는 영역에 비례한다.
+# 청크의 각 행 양 끝에 이웃 청크의 경계 비트를 한 칸씩 붙인 chunk_size + 2 비트 행을 만들면, 회전으로 섞이는 양 끝 비트를 버리는
+# 것만으로 step_packed_row를 그대로 사용할 수 있다.
+class ChunkedGrid:
+    def __init__(self, chunk_size=64):
+        self.chunk_size = chunk_size
+        self.mask = (1 << chunk_size) - 1
+        self.chunks = {}
+
+    def get(self, y, x):
+        cy, y = divmod(y, self.chunk_size)
+        cx, x = divmod(x, self.chunk_size)
+        chunk = self.chunks.get((cy, cx))
+        if chunk is not None and (chunk[y] >> x) & 1:
+            return ALIVE
+        return EMPTY
+
+    def set(self, y, x, state):
+        cy, y = divmod(y, self.chunk_size)
+        cx, x = divmod(x, self.chunk_size)
+        key = (cy, cx)
+        chunk = self.chunks.get(key)
+        if state == ALIVE:
+            if chunk is None:
+                chunk = self.chunks[key] = [0] * self.chunk_size
+            chunk[y] |= 1 << x
+        elif chunk is not None:
+            chunk[y] &= ~(1 << x)
+            if not any(chunk):
+                del self.chunks[key]
+
+    def population(self):
+        return sum(bin(row).count('1') for chunk in self.chunks.values() for row in chunk)
+
+    # 살아 있는 셀을 모두 포함하는 가장 작은 직사각형 (top, left, bottom, right)이다. bottom과 right는 포함하지 않는다.
+    def bounds(self):
+        if not self.chunks:
+            return 0, 0, 0, 0
+        size = self.chunk_size
+        top = left = bottom = right = None
+        for (cy, cx), chunk in self.chunks.items():
+            used = [y for y, row in enumerate(chunk) if row]
+            columns = 0
+            for row in chunk:
+                columns |= row
+            low = cx * size + (columns & -columns).bit_length() - 1
+            high = cx * size + columns.bit_length()
+            first = cy * size + used[0]
+            last = cy * size + used[-1] + 1
+            top = first if top is None else min(top, first)
+            bottom = last if bottom is None else max(bottom, last)
+            left = low if left is None else min(left, low)
+            right = high if right is None else max(right, high)
+        return top, left, bottom, right
+
+    # 평면의 일부를 잘라 Grid로 만든다. 출력하거나 다른 변형과 비교할 때 사용한다.
+    def to_grid(self, top, left, height, width):
+        grid = Grid(height, width)
+        for y in range(height):
+            for x in range(width):
+                grid.set(y, x, self.get(top + y, left + x))
+        return grid
+
+    def __str__(self):
+        top, left, bottom, right = self.bounds()
+        return str(self.to_grid(top, left, bottom - top, right - left))
+
+
+# 위아래 청크의 경계 행까지 포함해 chunk_size + 2개의 확장 행을 만든다. 확장 행의 0번 비트는 서쪽 청크의 마지막 열,
+# 마지막 비트는 동쪽 청크의 첫 열이다.
+def extended_rows(chunks, cy, cx, size):
+    rows = []
+    for dy, ys in ((-1, (size - 1,)), (0, range(size)), (1, (0,))):
+        west = chunks.get((cy + dy, cx - 1))
+        center = chunks.get((cy + dy, cx))
+        east = chunks.get((cy + dy, cx + 1))
+        for y in ys:
+            row = center[y] << 1 if center is not None else 0
+            if west is not None:
+                row |= (west[y] >> (size - 1)) & 1
+            if east is not None:
+                row |= (east[y] & 1) << (size + 1)
+            rows.append(row)
+    return rows
+
+
+@simulate.register(ChunkedGrid)
+def simulate_chunked(grid, logic=game_logic):
+    if logic(EMPTY, 0) == ALIVE:
+        raise ValueError('ChunkedGrid는 B0 규칙을 지원하지 않습니다')
+    if logic is not game_logic:
+        births, survivals = rule_sets(logic)
+
+    size = grid.chunk_size
+    width = size + 2
+    mask = (1 << width) - 1
+    next_grid = ChunkedGrid(size)
+
+    candidates = set()
+    for cy, cx in grid.chunks:
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                candidates.add((cy + dy, cx + dx))
+
+    for cy, cx in candidates:
+        rows = extended_rows(grid.chunks, cy, cx, size)
+        if not any(rows):
+            continue
+        chunk = []
+        for y in range(size):
+            if logic is game_logic:
+                row = step_packed_row(rows[y], rows[y + 1], rows[y + 2], width, mask)
+            else:
+                row = step_packed_row_rule(
+                    rows[y], rows[y + 1], rows[y + 2], width, mask, births, survivals)
+            chunk.append((row >> 1) & grid.mask)
+        if any(chunk):
+            next_grid.chunks[(cy, cx)] = chunk
+
+    return next_grid
+
+
+def use_chunked_grid():
+    grid = make_glider(ChunkedGrid(chunk_size=4))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid.to_grid(-1, -1, 6, 8)))
+        grid = simulate(grid)
+
+    print(columns)
+    for i in range(20):
+        grid = simulate(grid)
+    print(f'25 세대 뒤 범위: {grid.bounds()}, 청크 {len(grid.chunks)}개')
+
+
+# 토러스 보드는 글라이더가 충돌하지 않도록 이동 거리만큼 미리 할당해야 하지만, ChunkedGrid는 글라이더 주변 청크만 사용한다.
+# 리스트로 된 Grid는 셀마다 포인터를 하나씩 저장하므로 메모리가 보드 넓이에 비례한다. 너무 느리므로 grid_generations 세대만 진행한다.
+# PackedGrid는 빈 행이 int 0 하나라서 메모리는 작지만, 세대마다 모든 행을 계산하므로 세대당 시간이 보드 크기에 비례한다.
+def compare_chunked_grid(generations=1000, grid_generations=3):
+    import tracemalloc
+
+    size = generations // 4 + 16
+    for name, make_grid, steps in [
+            (f'{size}x{size} Grid', partial(Grid, size, size), grid_generations),
+            (f'{size}x{size} PackedGrid', partial(PackedGrid, size, size), generations),
+            ('ChunkedGrid', ChunkedGrid, generations)]:
+        tracemalloc.start()  # 미리 할당하는 보드의 메모리도 재도록 보드를 만들기 전에 시작한다
+        grid = make_glider(make_grid())
+        start = time.perf_counter()
+        for _ in range(steps):
+            grid = simulate(grid)
+        delta = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{name} {steps} 세대: 세대당 {delta / steps * 1000:.2f}ms, '
+              f'최대 메모리 {peak / 1024:,.0f}KB')
+
+# ======================================================================================================================
+# 이웃의 위치는 보드 크기마다 한 번만 계산하라
+# count_neighbors(y, x, get)은 셀마다 get 클로저를 여덟 번 호출하고, get은 호출될 때마다 나머지 연산 두 번과 리스트 인덱싱 두 번을 한다.
+# 보드 크기가 정해지면 어떤 셀의 이웃이 어디에 있는지는 바뀌지 않으므로 이 계산을 세대마다, 셀마다 반복할 필요가 없다.
+# FlatGrid는 보드 전체를 셀당 1바이트(0 또는 1)인 bytearray 하나에 저장하고, 토러스 경계를 넘는 위아래 행의 시작 위치를
+# array('I') 테이블로 보드 크기마다 한 번만 만들어 둔다. 열 방향의 경계는 행을 한 칸씩 돌린 슬라이스로 처리한다.
+# 한 행을 계산할 때는 먼저 위, 현재, 아래 행을 더한 열 합계를 만들고, 각 셀의 3x3 합계를 서쪽, 현재, 동쪽 열 합계로 구한다.
+# 규칙은 (현재 상태, 3x3 합계)로 인덱싱하는 18바이트 테이블로 바꿔 두므로 안쪽 루프는 함수 호출 없는 컴프리헨션 하나다.
+# 셀마다 이웃 8개의 위치를 array('I')로 저장하는 방법도 측정했지만, 인덱싱 횟수가 많아서 이 방법의 절반 정도 속도밖에 나오지 않았다.
+class FlatGrid:
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.cells = bytearray(height * width)
+
+    def get(self, y, x):
+        if self.cells[(y % self.height) * self.width + x % self.width]:
+            return ALIVE
+        return EMPTY
+
+    def set(self, y, x, state):
+        index = (y % self.height) * self.width + x % self.width
+        self.cells[index] = 1 if state == ALIVE else 0
+
+    def __str__(self):
+        text = self.cells.translate(FLAT_TEXT).decode()
+        width = self.width
+        return ''.join(text[i:i + width] + '\n' for i in range(0, len(text), width))
+
+
+FLAT_TEXT = bytes.maketrans(b'\x00\x01', (EMPTY + ALIVE).encode())
+
+
+# y 번째 행의 위와 아래 행이 cells에서 시작하는 위치다.
+@lru_cache(maxsize=None)
+def wrap_tables(height, width):
+    above = array('I', (((y - 1) % height) * width for y in range(height)))
+    below = array('I', (((y + 1) % height) * width for y in range(height)))
+    return above, below
+
+
+# 현재 셀을 포함한 3x3 합계는 살아 있는 셀이면 이웃 수 + 1이므로, 8 * 현재 상태 + 3x3 합계로 인덱싱한다.
+@lru_cache(maxsize=None)
+def rule_table_flat(logic):
+    births, survivals = rule_sets(logic)
+    table = bytearray(18)
+    for n in range(9):
+        table[n] = n in births
+        table[9 + n] = n in survivals
+    return bytes(table)
+
+
+@simulate.register(FlatGrid)
+def simulate_flat(grid, logic=game_logic):
+    height = grid.height
+    width = grid.width
+    cells = grid.cells
+    above, below = wrap_tables(height, width)
+    table = rule_table_flat(logic)
+
+    next_grid = FlatGrid(height, width)
+    next_cells = next_grid.cells
+    for y in range(height):
+        start = y * width
+        row = cells[start:start + width]
+        up = cells[above[y]:above[y] + width]
+        down = cells[below[y]:below[y] + width]
+        columns = [a + b + c for a, b, c in zip(up, row, down)]
+        west = columns[-1:] + columns[:-1]
+        east = columns[1:] + columns[:1]
+        next_cells[start:start + width] = bytes([
+            table[8 * state + w + c + e]
+            for state, w, c, e in zip(row, west, columns, east)])
+    return next_grid
+
+
+def use_flat_grid():
+    grid = make_glider(FlatGrid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid = simulate(grid)  # simulate_flat이 호출된다
+
+    print(columns)
+
+
+def compare_flat_grid(size=256, generations=5):
+    grid = Grid(size, size)
+    flat_grid = FlatGrid(size, size)
+    for y in range(size):
+        for x in range(size):
+            if random.random() < 0.3:
+                grid.set(y, x, ALIVE)
+                flat_grid.set(y, x, ALIVE)
+
+    start = time.perf_counter()
+    for _ in range(generations):
+        grid = simulate(grid)
+    list_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(generations):
+        flat_grid = simulate(flat_grid)
+    flat_time = time.perf_counter() - start
+
+    assert str(grid) == str(flat_grid)
+    print(f'{size}x{size} {generations} 세대: Grid {list_time:.3f}초, '
+          f'FlatGrid {flat_time:.3f}초 ({list_time / flat_time:.1f}배)')
+
+# ======================================================================================================================
+if __name__ == "__main__":
+    numpy_demos = [use_numpy_grid, compare_numpy_grid] if np is not None else []
+    for mtd in numpy_demos + [
+        use_packed_grid,
+        compare_packed_grid,
+        use_sparse_grid,
+        compare_sparse_grid,
+        use_simulation,
+        compare_simulation,
+        use_cycle_detection,
+        use_compile_rule,
+        compare_compile_rule,
+        use_chunked_grid,
+        compare_chunked_grid,
+        use_flat_grid,
+        compare_flat_grid,
+    ]:
+        mtd()
+        print('==================================================================')
@@ -0,0 +1,232 @@
+# ======================================================================================================================
+# 아주 먼 미래의 세대가 필요하면 HashLife로 시간과 공간을 함께 압축하라.
+# chapter_7_3의 Grid 변형들은 한 세대를 빠르게 계산하지만, 2^20 세대 이상을 진행하려면 simulate를 백만 번 넘게 호출해야 한다.
+# HashLife는 보드를 쿼드트리(quadtree)로 표현하고, 내용이 같은 노드는 단 하나의 객체만 만들어 공유한다(정규화, canonicalization).
+# 크기가 2^k인 노드의 중앙 2^(k-1) 영역은 2^(k-2) 세대 뒤에도 그 노드 안의 셀들만으로 결정되므로, 이 결과를 노드별로 메모이제이션하면
+# 반복되는 패턴은 한 번만 계산된다. 그 결과 한 번의 호출로 2^j 세대를 건너뛸 수 있다.
+
+# 노드 캐시와 결과 캐시는 functools.lru_cache로 크기를 제한한다. 노드는 내용으로 해시와 동등성을 비교하므로 캐시에서 밀려난
+# 노드가 다시 만들어져도 결과는 달라지지 않는다. 정규화는 메모리와 비교 시간을 줄이기 위한 것일 뿐이다.
+# ======================================================================================================================
+from collections import namedtuple
+from functools import lru_cache
+import time
+
+from chapter_7_3 import ALIVE, EMPTY, Grid, ColumnPrinter
+from chapter_7_3 import game_logic, make_glider, simulate
+
+
+# 노드의 해시는 자식 노드의 해시로 미리 계산해 둔다. 튜플의 기본 해시를 쓰면 매번 트리 전체를 따라 내려가야 한다.
+class Node(namedtuple('Node', ('level', 'nw', 'ne', 'sw', 'se', 'population', 'hash'))):
+    __slots__ = ()
+
+    def __hash__(self):
+        return self.hash
+
+
+OFF = Node(0, None, None, None, None, 0, 0)
+ON = Node(0, None, None, None, None, 1, 1)
+
+
+def is_power_of_two(value):
+    return value > 0 and value & (value - 1) == 0
+
+
+# 빈 노드는 언제나 빈 노드로 진행된다고 가정하므로 이웃이 없는 빈 셀이 살아나는 규칙(B0)은 지원하지 않는다.
+class HashLife:
+    def __init__(self, max_nodes=2**20, max_results=2**20, logic=game_logic):
+        if logic(EMPTY, 0) == ALIVE:
+            raise ValueError('HashLife는 B0 규칙을 지원하지 않습니다')
+        self.logic = logic
+        self.join = lru_cache(maxsize=max_nodes)(self._join)
+        self.empty = lru_cache(maxsize=None)(self._empty)
+        self.successor = lru_cache(maxsize=max_results)(self._successor)
+
+    # 같은 네 자식으로 join을 호출하면 캐시에 있는 같은 노드 객체가 반환된다.
+    def _join(self, nw, ne, sw, se):
+        population = nw.population + ne.population + sw.population + se.population
+        node_hash = hash((nw.level + 1, nw, ne, sw, se))
+        return Node(nw.level + 1, nw, ne, sw, se, population, node_hash)
+
+    def _empty(self, level):
+        if level == 0:
+            return OFF
+        child = self.empty(level - 1)
+        return self.join(child, child, child, child)
+
+    # 4x4 노드(level 2)의 중앙 2x2 셀을 한 세대 진행한다. 규칙은 생성자에서 받은 logic(기본값은 game_logic)을 사용한다.
+    def _life_4x4(self, node):
+        cells = [
+            [node.nw.nw, node.nw.ne, node.ne.nw, node.ne.ne],
+            [node.nw.sw, node.nw.se, node.ne.sw, node.ne.se],
+            [node.sw.nw, node.sw.ne, node.se.nw, node.se.ne],
+            [node.sw.sw, node.sw.se, node.se.sw, node.se.se],
+        ]
+        result = []
+        for y in (1, 2):
+            for x in (1, 2):
+                neighbors = 0
+                for dy in (-1, 0, 1):
+                    for dx in (-1, 0, 1):
+                        if dy or dx:
+                            neighbors += cells[y + dy][x + dx].population
+                state = ALIVE if cells[y][x].population else EMPTY
+                next_state = self.logic(state, neighbors)
+                result.append(ON if next_state == ALIVE else OFF)
+        return self.join(*result)
+
+    # 크기가 2^k인 노드의 중앙 2^(k-1) 영역을 2^j 세대 진행한 노드를 반환한다. j는 k - 2 이하여야 한다.
+    # 노드를 3x3개의 겹치는 2^(k-1) 부분 노드로 나눠 각각 진행한 다음, j가 최대치면 그 결과를 다시 2x2로 묶어 한 번 더 진행하고,
+    # 그보다 작으면 결과의 중앙 부분만 잘라 붙인다.
+    def _successor(self, node, j):
+        if node.population == 0:
+            return node.nw
+        if node.level == 2:
+            return self._life_4x4(node)
+
+        join = self.join
+        successor = self.successor
+        j = min(j, node.level - 2)
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        c1 = successor(join(nw.nw, nw.ne, nw.sw, nw.se), j)
+        c2 = successor(join(nw.ne, ne.nw, nw.se, ne.sw), j)
+        c3 = successor(join(ne.nw, ne.ne, ne.sw, ne.se), j)
+        c4 = successor(join(nw.sw, nw.se, sw.nw, sw.ne), j)
+        c5 = successor(join(nw.se, ne.sw, sw.ne, se.nw), j)
+        c6 = successor(join(ne.sw, ne.se, se.nw, se.ne), j)
+        c7 = successor(join(sw.nw, sw.ne, sw.sw, sw.se), j)
+        c8 = successor(join(sw.ne, se.nw, sw.se, se.sw), j)
+        c9 = successor(join(se.nw, se.ne, se.sw, se.se), j)
+
+        if j < node.level - 2:
+            return join(
+                join(c1.se, c2.sw, c4.ne, c5.nw),
+                join(c2.se, c3.sw, c5.ne, c6.nw),
+                join(c4.se, c5.sw, c7.ne, c8.nw),
+                join(c5.se, c6.sw, c8.ne, c9.nw))
+
+        return join(
+            successor(join(c1, c2, c4, c5), j),
+            successor(join(c2, c3, c5, c6), j),
+            successor(join(c4, c5, c7, c8), j),
+            successor(join(c5, c6, c8, c9), j))
+
+    # Grid.get은 좌표를 나머지 연산으로 감싸므로, 높이와 너비가 다른 보드도 큰 쪽에 맞춘 정사각형으로 반복해서 채워진다.
+    def from_grid(self, grid):
+        size = max(grid.height, grid.width)
+        level = size.bit_length() - 1
+
+        def build(y, x, level):
+            if level == 0:
+                return ON if grid.get(y, x) == ALIVE else OFF
+            half = 1 << (level - 1)
+            return self.join(
+                build(y, x, level - 1),
+                build(y, x + half, level - 1),
+                build(y + half, x, level - 1),
+                build(y + half, x + half, level - 1))
+
+        return build(0, 0, level)
+
+    def to_grid(self, node, height, width):
+        grid = Grid(height, width)
+
+        def fill(node, y, x):
+            if node.population == 0 or y >= height or x >= width:
+                return
+            if node.level == 0:
+                grid.set(y, x, ALIVE)
+                return
+            half = 1 << (node.level - 1)
+            fill(node.nw, y, x)
+            fill(node.ne, y, x + half)
+            fill(node.sw, y + half, x)
+            fill(node.se, y + half, x + half)
+
+        fill(node, 0, 0)
+        return grid
+
+    # 토러스 보드를 2^j 세대 진행한다. 주기가 2^k인 보드를 같은 노드 네 개로 계속 이어 붙이면 무한히 반복되는 평면이 되고,
+    # 정규화 덕분에 이어 붙인 노드는 레벨마다 하나씩만 추가된다. 결과의 중앙 영역은 주기의 배수만큼 떨어져 있으므로
+    # nw 쪽으로 내려가기만 하면 진행된 원래 보드를 얻을 수 있다.
+    def step(self, node, j):
+        top = max(node.level + 1, j + 1)
+        tiled = node
+        while tiled.level < top + 1:
+            tiled = self.join(tiled, tiled, tiled, tiled)
+        result = self.successor(tiled, j)
+        while result.level > node.level:
+            result = result.nw
+        return result
+
+    # generations를 2의 거듭제곱의 합으로 나눠 각 자리마다 step을 한 번씩 호출한다.
+    def advance(self, grid, generations):
+        if not (is_power_of_two(grid.height) and is_power_of_two(grid.width)):
+            raise ValueError('HashLife는 높이와 너비가 2의 거듭제곱인 보드만 '
+                             f'지원합니다: {grid.height}x{grid.width}')
+        node = self.from_grid(grid)
+        j = 0
+        while generations:
+            if generations & 1:
+                node = self.step(node, j)
+            generations >>= 1
+            j += 1
+        return self.to_grid(node, grid.height, grid.width)
+
+    # 메모리 크기를 정할 수 있도록 캐시에 남아 있는 노드 수와 적중률을 알려준다.
+    def stats(self):
+        join_info = self.join.cache_info()
+        successor_info = self.successor.cache_info()
+        join_lookups = join_info.hits + join_info.misses
+        successor_lookups = successor_info.hits + successor_info.misses
+        return {
+            'node_count': join_info.currsize,
+            'node_cache_hit_rate': join_info.hits / join_lookups if join_lookups else 0.0,
+            'result_count': successor_info.currsize,
+            'result_cache_hit_rate': (
+                successor_info.hits / successor_lookups if successor_lookups else 0.0),
+        }
+
+
+default_engine = HashLife()
+
+
+def advance(grid, generations, engine=default_engine):
+    return engine.advance(grid, generations)
+
+
+def use_hashlife():
+    grid = make_glider(Grid(8, 8))
+
+    columns = ColumnPrinter()
+    for generations in range(5):
+        columns.append(str(advance(grid, generations)))
+
+    print(columns)
+
+
+# 64x64 토러스에서 글라이더는 256 세대마다 제자리로 돌아오므로, 2^20 세대 뒤의 보드는 처음과 같아야 한다.
+def compare_hashlife(size=64):
+    engine = HashLife()
+    grid = make_glider(Grid(size, size))
+
+    expected = grid
+    for _ in range(100):
+        expected = simulate(expected)
+    assert str(engine.advance(grid, 100)) == str(expected)
+
+    start = time.perf_counter()
+    result = engine.advance(grid, 2**20)
+    delta = time.perf_counter() - start
+    assert str(result) == str(grid)
+    print(f'{size}x{size} 보드 2^20 세대: {delta:.3f}초')
+    print(engine.stats())
+
+# ======================================================================================================================
+if __name__ == "__main__":
+    for mtd in [
+        use_hashlife,
+        compare_hashlife,
+    ]:
+        mtd()
+        print('==================================================================')
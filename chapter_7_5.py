@@ -0,0 +1,741 @@
+# ======================================================================================================================
+# CPU를 많이 쓰는 생명 게임 계산은 여러 프로세스로 나눠라.
+# better way 57의 simulate_threaded와 better way 59의 simulate_pool은 스레드를 사용하므로 count_neighbors와 game_logic 같은
+# CPU 위주의 계산은 GIL 때문에 결국 한 번에 하나씩 실행된다. (better way 53 참조)
+# 진짜 병렬성을 얻으려면 프로세스를 사용해야 한다. 하지만 세대마다 Grid 전체를 피클링해서 자식 프로세스에 보내면
+# 직렬화 비용이 계산 비용보다 더 커진다. (better way 64 참조)
+
+# multiprocessing.shared_memory를 사용하면 여러 프로세스가 같은 메모리 블록을 직접 읽고 쓸 수 있다.
+# 보드를 행 묶음(band)으로 나눠 작업자 프로세스마다 하나씩 맡기고, 각 작업자는 자기 band와 바로 위아래 한 행(halo)만 읽는다.
+# 세대 사이에 주고받는 데이터는 공유 메모리 안에 있는 halo 행뿐이며, Barrier로 모든 작업자가 한 세대를 끝낼 때까지 기다린다.
+# ======================================================================================================================
+from multiprocessing import Barrier, Process, current_process
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import os
+import time
+
+from chapter_7_3 import ALIVE, EMPTY, Grid, ColumnPrinter
+from chapter_7_3 import HIGHLIFE, count_neighbors, game_logic, make_glider, simulate, step_cell
+
+
+class SimulationError(Exception):
+    pass
+
+
+# 보드 높이를 count개의 band로 최대한 고르게 나눈다.
+def split_bands(height, count):
+    count = max(1, min(count, height))
+    size, extra = divmod(height, count)
+    bands = []
+    start = 0
+    for i in range(count):
+        stop = start + size + (1 if i < extra else 0)
+        bands.append((start, stop))
+        start = stop
+    return bands
+
+
+# 보드를 band_height개의 행씩 자른다. 마지막 band는 더 작을 수 있다.
+def bands_of(height, band_height):
+    bands = []
+    for start in range(0, height, band_height):
+        bands.append((start, min(start + band_height, height)))
+    return bands
+
+
+# 공유 메모리에는 한 셀당 1바이트인 보드 두 장이 연달아 들어있다. 짝수 세대에는 앞 보드를 읽고 뒤 보드에 쓰며,
+# 홀수 세대에는 반대로 한다. 다른 작업자의 band는 위아래 halo 행을 읽을 때만 접근한다.
+# 한 작업자가 실패하면 barrier를 깨뜨려서 barrier.wait에서 기다리는 나머지 작업자도 BrokenBarrierError로 끝나게 한다.
+def step_band(name, height, width, start, stop, generations, barrier,
+              logic=game_logic):
+    shm = shared_memory.SharedMemory(name=name)
+    size = height * width
+    buffers = (shm.buf[:size], shm.buf[size:2 * size])
+    try:
+        for generation in range(generations):
+            current = buffers[generation % 2]
+            next_cells = buffers[1 - generation % 2]
+
+            def get(y, x):
+                if current[(y % height) * width + x % width]:
+                    return ALIVE
+                return EMPTY
+
+            def set(y, x, state):
+                next_cells[y * width + x] = 1 if state == ALIVE else 0
+
+            for y in range(start, stop):
+                for x in range(width):
+                    step_cell(y, x, get, set, logic)
+
+            barrier.wait()  # 모든 band가 끝나야 다음 세대의 halo를 읽을 수 있다
+    except Exception:
+        barrier.abort()
+        raise
+    finally:
+        for buffer in buffers:
+            buffer.release()
+        shm.close()
+
+
+# 모든 프로세스가 끝나거나 하나라도 실패하면 돌아온다.
+def join_processes(processes):
+    pending = {process.sentinel: process for process in processes}
+    while pending:
+        for sentinel in wait(list(pending)):
+            process = pending.pop(sentinel)
+            process.join()
+            if process.exitcode != 0:
+                return
+
+
+def simulate_multiprocess(grid, workers=os.cpu_count(), generations=1,
+                          logic=game_logic):
+    height = grid.height
+    width = grid.width
+    size = height * width
+    shm = shared_memory.SharedMemory(create=True, size=2 * size)
+    try:
+        for y in range(height):
+            row = bytes(1 if grid.get(y, x) == ALIVE else 0 for x in range(width))
+            shm.buf[y * width:(y + 1) * width] = row
+
+        bands = split_bands(height, workers)
+        barrier = Barrier(len(bands))
+        processes = []
+        try:
+            for start, stop in bands:
+                args = (shm.name, height, width, start, stop, generations, barrier,
+                        logic)
+                process = Process(target=step_band, args=args, name=f'band-{start}')
+                process.start()  # 팬아웃
+                processes.append(process)
+
+            join_processes(processes)  # 팬인
+        finally:
+            # 실패한 작업자가 있으면 아직 실행 중인 작업자를 정리한다
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+
+        failed = [p.exitcode for p in processes if p.exitcode != 0]
+        if failed:
+            raise SimulationError(f'작업자 프로세스가 실패했습니다: {failed}')
+
+        offset = (generations % 2) * size
+        next_grid = Grid(height, width)
+        for y in range(height):
+            start = offset + y * width
+            row = shm.buf[start:start + width]
+            next_grid.rows[y] = [ALIVE if cell else EMPTY for cell in row]
+            row.release()
+        return next_grid
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def use_simulate_multiprocess():
+    grid = make_glider(Grid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid = simulate_multiprocess(grid, workers=2)
+
+    print(columns)
+
+
+# 코어가 8개인 머신이라면 작업자 수에 거의 비례해 빨라진다. 코어가 하나뿐이면 프로세스를 늘려도 빨라지지 않는다.
+def compare_simulate_multiprocess(size=128, generations=10):
+    grid = make_glider(Grid(size, size))
+
+    start = time.perf_counter()
+    expected = grid
+    for _ in range(generations):
+        expected = simulate(expected)
+    serial_time = time.perf_counter() - start
+    print(f'{size}x{size} 보드 {generations} 세대 simulate: {serial_time:.3f}초')
+
+    for workers in (1, 2, 4, 8):
+        start = time.perf_counter()
+        result = simulate_multiprocess(grid, workers, generations)
+        delta = time.perf_counter() - start
+        assert str(result) == str(expected)
+        print(f'작업자 {workers}개: {delta:.3f}초 ({serial_time / delta:.1f}배)')
+
+    # 한 band의 작업자만 실패해도 나머지 작업자가 barrier에서 멈추지 않고 SimulationError가 발생한다
+    start = time.perf_counter()
+    try:
+        simulate_multiprocess(grid, 2, generations, logic=fail_first_band)
+    except SimulationError as e:
+        print(f'첫 번째 band 실패: {e} ({time.perf_counter() - start:.3f}초)')
+    else:
+        assert False, '실패가 전달되지 않았습니다'
+
+
+def fail_first_band(state, neighbors):
+    if current_process().name == 'band-0':
+        raise ValueError('첫 번째 band에서 실패했습니다')
+    return game_logic(state, neighbors)
+
+# ======================================================================================================================
+# 코루틴을 셀마다 만들지 말고 행 단위로 묶어라
+# better way 60의 simulate 코루틴은 셀마다 step_cell 코루틴을 하나씩 만들어 asyncio.gather에 넘긴다. 1000x1000 보드라면
+# 코루틴 객체 백만 개와 원소가 백만 개인 gather가 만들어지고, 실제 계산보다 이를 만들고 스케줄링하는 시간과 메모리가 더 크다.
+# 대신 정해진 개수(concurrency)의 작업자 태스크가 band 단위로 일을 가져가게 만들면 태스크 수와 동시에 진행되는 I/O 수를 모두 제한할 수 있다.
+# 모든 태스크가 같은 스레드의 이벤트 루프에서 실행되므로 band 이터레이터를 공유해도 락이 필요 없다.
+import asyncio
+
+
+async def game_logic_async(state, neighbors):
+    # 여기서 I/O를 수행한다
+    #data = await my_socket.recv(100)
+    return game_logic(state, neighbors)
+
+
+# compile_rule로 만든 규칙처럼 동기 함수로 된 logic을 코루틴 변형에 넘길 수 있게 감싼다. 이미 코루틴 함수라면 그대로 돌려준다.
+def to_async(logic):
+    if asyncio.iscoroutinefunction(logic):
+        return logic
+
+    async def logic_async(state, neighbors):
+        return logic(state, neighbors)
+
+    return logic_async
+
+
+async def step_cell_async(y, x, get, set, logic=game_logic_async):
+    state = get(y, x)
+    neighbors = count_neighbors(y, x, get)
+    next_state = await logic(state, neighbors)
+    set(y, x, next_state)
+
+
+# better way 60과 같은 방식이다. 비교용으로 남겨둔다.
+async def simulate_async(grid, logic=game_logic_async):
+    next_grid = Grid(grid.height, grid.width)
+
+    tasks = []
+    for y in range(grid.height):
+        for x in range(grid.width):
+            task = step_cell_async(
+                y, x, grid.get, next_grid.set, logic)  # 팬아웃
+            tasks.append(task)
+
+    await asyncio.gather(*tasks)  # 팬인
+
+    return next_grid
+
+
+# better way 60의 마지막 예제처럼 count_neighbors에서도 I/O를 수행하는 버전이다.
+async def count_neighbors_async(y, x, get):
+    count = count_neighbors(y, x, get)
+    # 여기서 I/O를 수행한다
+    #data = await my_socket.recv(100)
+    return count
+
+
+async def step_cell_async_io(y, x, get, set, logic=game_logic_async):
+    state = get(y, x)
+    neighbors = await count_neighbors_async(y, x, get)
+    next_state = await logic(state, neighbors)
+    set(y, x, next_state)
+
+
+async def simulate_async_io(grid, logic=game_logic_async):
+    next_grid = Grid(grid.height, grid.width)
+
+    tasks = []
+    for y in range(grid.height):
+        for x in range(grid.width):
+            task = step_cell_async_io(
+                y, x, grid.get, next_grid.set, logic)  # 팬아웃
+            tasks.append(task)
+
+    await asyncio.gather(*tasks)  # 팬인
+
+    return next_grid
+
+
+async def step_band_async(bands, grid, next_grid, logic=game_logic_async):
+    for start, stop in bands:
+        for y in range(start, stop):
+            for x in range(grid.width):
+                await step_cell_async(y, x, grid.get, next_grid.set, logic)
+
+
+# band_height개의 행을 하나의 작업 단위로 묶고, concurrency개의 작업자 태스크만 만든다.
+# 동시에 대기 중인 game_logic I/O는 최대 concurrency개다. logic에는 동기 함수도 넘길 수 있다.
+async def simulate_batched(grid, band_height=1, concurrency=16,
+                           logic=game_logic_async):
+    if band_height < 1:
+        raise ValueError(f'band_height는 1 이상이어야 합니다: {band_height}')
+    if concurrency < 1:
+        raise ValueError(f'concurrency는 1 이상이어야 합니다: {concurrency}')
+    logic = to_async(logic)
+    next_grid = Grid(grid.height, grid.width)
+    bands = iter(bands_of(grid.height, band_height))
+
+    tasks = []
+    for _ in range(concurrency):
+        task = step_band_async(bands, grid, next_grid, logic)  # 팬아웃
+        tasks.append(task)
+
+    await asyncio.gather(*tasks)  # 팬인
+
+    return next_grid
+
+
+def use_simulate_batched():
+    grid = make_glider(Grid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid = asyncio.run(simulate_batched(grid, band_height=2, concurrency=2))
+
+    print(columns)
+
+    # compile_rule로 만든 동기 규칙도 그대로 넘길 수 있다
+    grid = make_glider(Grid(5, 9))
+    expected = simulate(grid, HIGHLIFE)
+    grid = asyncio.run(simulate_batched(grid, band_height=2, concurrency=2, logic=HIGHLIFE))
+    assert str(grid) == str(expected)
+    print(HIGHLIFE.rulestring)
+    print(grid)
+
+
+def compare_simulate_batched(size=256):
+    import tracemalloc
+
+    grid = make_glider(Grid(size, size))
+    expected = simulate(grid)
+
+    for name, coroutine in [
+            ('셀마다 코루틴', lambda: simulate_async(grid)),
+            ('행 단위 작업자 16개', lambda: simulate_batched(grid)),
+            ('8행 단위 작업자 4개', lambda: simulate_batched(grid, 8, 4))]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = asyncio.run(coroutine())
+        delta = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert str(result) == str(expected)
+        print(f'{size}x{size} {name}: {delta:.3f}초, 최대 메모리 {peak / 1024**2:,.1f}MB')
+
+# ======================================================================================================================
+# ThreadPoolExecutor에는 셀이 아니라 band를 제출하라
+# better way 59의 simulate_pool은 셀마다 future를 하나씩 제출한다. submit은 호출될 때마다 락을 잡고 큐에 작업을 넣고
+# Future 객체를 만들기 때문에, 셀 하나를 계산하는 것보다 이 부가 비용이 더 크다.
+# band 단위로 제출하면 future 수가 band 수만큼으로 줄어든다. 또 각 band는 next_grid의 서로 겹치지 않는 행에만 쓰고
+# 현재 세대의 grid는 읽기만 하므로 LockingGrid의 락도 필요 없다. 풀은 호출하는 쪽에서 만들어 여러 세대에 걸쳐 재사용한다.
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+
+
+class LockingGrid(Grid):
+    def __init__(self, height, width):
+        super().__init__(height, width)
+        self.lock = Lock()
+
+    def __str__(self):
+        with self.lock:
+            return super().__str__()
+
+    def get(self, y, x):
+        with self.lock:
+            return super().get(y, x)
+
+    def set(self, y, x, state):
+        with self.lock:
+            return super().set(y, x, state)
+
+
+# better way 57과 같은 방식이다. 셀마다 스레드를 하나씩 시작한다. 비교용으로 남겨둔다.
+def simulate_threaded(grid, logic=game_logic):
+    next_grid = LockingGrid(grid.height, grid.width)
+
+    threads = []
+    for y in range(grid.height):
+        for x in range(grid.width):
+            args = (y, x, grid.get, next_grid.set, logic)
+            thread = Thread(target=step_cell, args=args)
+            thread.start()  # 팬아웃
+            threads.append(thread)
+
+    for thread in threads:
+        thread.join()  # 팬인
+
+    return next_grid
+
+
+# better way 59와 같은 방식이다. 비교용으로 남겨둔다.
+def simulate_pool(pool, grid, logic=game_logic):
+    next_grid = LockingGrid(grid.height, grid.width)
+    futures = []
+    for y in range(grid.height):
+        for x in range(grid.width):
+            args = (y, x, grid.get, next_grid.set, logic)
+            future = pool.submit(step_cell, *args)  # 팬아웃
+            futures.append(future)
+
+    for future in futures:
+        future.result()  # 팬인
+
+    return next_grid
+
+
+def step_rows(start, stop, grid, next_grid, logic=game_logic):
+    for y in range(start, stop):
+        for x in range(grid.width):
+            step_cell(y, x, grid.get, next_grid.set, logic)
+
+
+def simulate_pool_bands(pool, grid, band_height=16, logic=game_logic):
+    if band_height < 1:
+        raise ValueError(f'band_height는 1 이상이어야 합니다: {band_height}')
+    next_grid = Grid(grid.height, grid.width)
+    futures = []
+    for start, stop in bands_of(grid.height, band_height):
+        future = pool.submit(
+            step_rows, start, stop, grid, next_grid, logic)  # 팬아웃
+        futures.append(future)
+
+    for future in futures:
+        future.result()  # 팬인
+
+    return next_grid
+
+
+def use_simulate_pool_bands():
+    grid = make_glider(Grid(5, 9))
+
+    columns = ColumnPrinter()
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        for i in range(5):
+            columns.append(str(grid))
+            grid = simulate_pool_bands(pool, grid, band_height=2)
+
+    print(columns)
+
+
+def compare_simulate_pool_bands(size=128, generations=5):
+    grid = make_glider(Grid(size, size))
+    expected = grid
+    for _ in range(generations):
+        expected = simulate(expected)
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        for name, step in [
+                ('셀마다 future', simulate_pool),
+                ('1행 band', lambda pool, grid: simulate_pool_bands(pool, grid, 1)),
+                ('16행 band', simulate_pool_bands)]:
+            result = grid
+            start = time.perf_counter()
+            for _ in range(generations):
+                result = step(pool, result)
+            delta = time.perf_counter() - start
+            assert str(result) == str(expected)
+            print(f'{size}x{size} {generations} 세대 {name}: {delta:.3f}초')
+
+# ======================================================================================================================
+# Queue에는 셀 하나가 아니라 셀 묶음을 넣어라
+# better way 58의 simulate_pipeline은 셀마다 (y, x, state, neighbors) 튜플 하나를 in_queue에 넣고 out_queue에서 결과 하나를 꺼낸다.
+# Queue의 put과 get은 호출될 때마다 락을 잡고 조건 변수(Condition)로 대기 중인 스레드에게 알려야 하므로, 셀마다 이 동기화 비용을 치르게 된다.
+# 셀 리스트(batch)를 원소 하나로 취급하면 큐 연산 횟수가 batch_size 분의 1로 줄어든다. StoppableWorker는 원소가 무엇인지
+# 신경쓰지 않으므로 batch를 처리하는 함수만 넘기면 그대로 쓸 수 있다.
+from functools import partial
+from itertools import islice
+from queue import Queue
+
+
+class ClosableQueue(Queue):
+    SENTINEL = object()
+
+    def close(self):
+        self.put(self.SENTINEL)
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            try:
+                if item is self.SENTINEL:
+                    return   # 스레드를 종료시킨다
+                yield item
+            finally:
+                self.task_done()
+
+    # items를 batch_size개씩 리스트로 묶어 넣는다. 넣은 batch의 개수를 반환한다.
+    def put_many(self, items, batch_size):
+        it = iter(items)
+        count = 0
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                return count
+            self.put(batch)
+            count += 1
+
+    # close될 때까지 batch를 꺼내면서 그 안의 원소를 하나씩 돌려준다.
+    def get_many(self):
+        for batch in self:
+            yield from batch
+
+
+class StoppableWorker(Thread):
+    def __init__(self, func, in_queue, out_queue, **kwargs):
+        super().__init__(**kwargs)
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+
+    def run(self):
+        for item in self.in_queue:
+            result = self.func(item)
+            self.out_queue.put(result)
+
+
+def game_logic_thread(item, logic=game_logic):
+    y, x, state, neighbors = item
+    try:
+        next_state = logic(state, neighbors)
+    except Exception as e:
+        next_state = e
+    return (y, x, next_state)
+
+
+def game_logic_batch_thread(batch, logic=game_logic):
+    return [game_logic_thread(item, logic) for item in batch]
+
+
+# better way 58과 같은 방식이다. 비교용으로 남겨둔다.
+def simulate_pipeline(grid, in_queue, out_queue):
+    for y in range(grid.height):
+        for x in range(grid.width):
+            state = grid.get(y, x)
+            neighbors = count_neighbors(y, x, grid.get)
+            in_queue.put((y, x, state, neighbors))  # 팬아웃
+
+    in_queue.join()
+    out_queue.close()
+
+    next_grid = Grid(grid.height, grid.width)
+    for item in out_queue:  # 팬인
+        y, x, next_state = item
+        if isinstance(next_state, Exception):
+            raise SimulationError(y, x) from next_state
+        next_grid.set(y, x, next_state)
+
+    return next_grid
+
+
+def iter_cells(grid):
+    for y in range(grid.height):
+        for x in range(grid.width):
+            state = grid.get(y, x)
+            neighbors = count_neighbors(y, x, grid.get)
+            yield (y, x, state, neighbors)
+
+
+# in_queue의 작업자는 game_logic_batch_thread를 실행해야 한다.
+def simulate_pipeline_batched(grid, in_queue, out_queue, batch_size=256):
+    in_queue.put_many(iter_cells(grid), batch_size)  # 팬아웃
+
+    in_queue.join()
+    out_queue.close()
+
+    next_grid = Grid(grid.height, grid.width)
+    for item in out_queue.get_many():  # 팬인
+        y, x, next_state = item
+        if isinstance(next_state, Exception):
+            raise SimulationError(y, x) from next_state
+        next_grid.set(y, x, next_state)
+
+    return next_grid
+
+
+def run_pipeline(grid, generations, func, simulate_func, workers=5,
+                 queue_class=ClosableQueue):
+    in_queue = queue_class()
+    out_queue = queue_class()
+    threads = []
+    for _ in range(workers):
+        thread = StoppableWorker(func, in_queue, out_queue)
+        thread.start()
+        threads.append(thread)
+
+    try:
+        for _ in range(generations):
+            grid = simulate_func(grid, in_queue, out_queue)
+    finally:
+        for thread in threads:
+            in_queue.close()
+        for thread in threads:
+            thread.join()
+
+    return grid
+
+
+def use_simulate_pipeline_batched():
+    grid = make_glider(Grid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid = run_pipeline(
+            grid, 1, game_logic_batch_thread,
+            partial(simulate_pipeline_batched, batch_size=8))
+
+    print(columns)
+
+
+def compare_simulate_pipeline_batched(size=128, generations=5):
+    grid = make_glider(Grid(size, size))
+    expected = grid
+    for _ in range(generations):
+        expected = simulate(expected)
+
+    start = time.perf_counter()
+    result = run_pipeline(grid, generations, game_logic_thread, simulate_pipeline)
+    delta = time.perf_counter() - start
+    assert str(result) == str(expected)
+    print(f'{size}x{size} {generations} 세대 셀마다 put/get: {delta:.3f}초')
+
+    for batch_size in (16, 256, 4096):
+        simulate_func = partial(simulate_pipeline_batched, batch_size=batch_size)
+        start = time.perf_counter()
+        result = run_pipeline(grid, generations, game_logic_batch_thread, simulate_func)
+        delta = time.perf_counter() - start
+        assert str(result) == str(expected)
+        print(f'{size}x{size} {generations} 세대 {batch_size}개씩 묶어서 put/get: {delta:.3f}초')
+
+# ======================================================================================================================
+# 읽기만 하는 현재 세대에는 락을 걸지 마라
+# better way 57과 59의 LockingGrid는 get과 set 모두 같은 Lock을 잡는다. 셀 하나를 계산할 때 이웃을 8번 읽으므로
+# 모든 스레드가 하나의 뮤텍스 앞에 줄을 서게 된다. 하지만 한 세대를 계산하는 동안 현재 세대는 아무도 바꾸지 않는다.
+# SnapshotGrid는 행을 문자열 튜플로 저장하는 불변(immutable) 보드라서 여러 스레드가 락 없이 읽어도 안전하다.
+# 다음 세대는 스레드마다 자기 band만 담는 BandGrid에 쓰므로 쓰기에도 락이 필요 없다. 모든 스레드가 끝나면 band들을 이어 붙여
+# 다음 SnapshotGrid를 만든다.
+class SnapshotGrid:
+    def __init__(self, rows):
+        self.rows = tuple(rows)
+        self.height = len(self.rows)
+        self.width = len(self.rows[0]) if self.rows else 0
+
+    @classmethod
+    def from_grid(cls, grid):
+        rows = []
+        for y in range(grid.height):
+            rows.append(''.join(grid.get(y, x) for x in range(grid.width)))
+        return cls(rows)
+
+    def get(self, y, x):
+        return self.rows[y % self.height][x % self.width]
+
+    def __str__(self):
+        return ''.join(row + '\n' for row in self.rows)
+
+
+class BandGrid:
+    def __init__(self, start, stop, width):
+        self.start = start
+        self.stop = stop
+        self.width = width
+        self.rows = []
+        for _ in range(stop - start):
+            self.rows.append([EMPTY] * width)
+
+    def set(self, y, x, state):
+        self.rows[y - self.start][x % self.width] = state
+
+
+def simulate_snapshot_threaded(grid, threads=8, logic=game_logic):
+    if not isinstance(grid, SnapshotGrid):
+        grid = SnapshotGrid.from_grid(grid)
+
+    bands = []
+    workers = []
+    for start, stop in split_bands(grid.height, threads):
+        band = BandGrid(start, stop, grid.width)
+        bands.append(band)
+        thread = Thread(target=step_rows, args=(start, stop, grid, band, logic))
+        thread.start()  # 팬아웃
+        workers.append(thread)
+
+    for thread in workers:
+        thread.join()  # 팬인
+
+    rows = []
+    for band in bands:
+        for row in band.rows:
+            rows.append(''.join(row))
+    return SnapshotGrid(rows)
+
+
+# 비교 대상: 같은 방식으로 band를 나누되, 현재 세대와 다음 세대 모두 LockingGrid를 사용한다.
+def simulate_locking_threaded(grid, threads=8, logic=game_logic):
+    next_grid = LockingGrid(grid.height, grid.width)
+
+    workers = []
+    for start, stop in split_bands(grid.height, threads):
+        thread = Thread(
+            target=step_rows, args=(start, stop, grid, next_grid, logic))
+        thread.start()  # 팬아웃
+        workers.append(thread)
+
+    for thread in workers:
+        thread.join()  # 팬인
+
+    return next_grid
+
+
+def use_simulate_snapshot_threaded():
+    grid = make_glider(Grid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid = simulate_snapshot_threaded(grid, threads=2)
+
+    print(columns)
+
+
+def compare_simulate_snapshot_threaded(size=128, generations=3):
+    grid = make_glider(LockingGrid(size, size))
+    expected = grid
+    for _ in range(generations):
+        expected = simulate(expected)
+
+    for threads in (1, 2, 4, 8, 16, 32):
+        timings = []
+        for simulate_func in (simulate_locking_threaded, simulate_snapshot_threaded):
+            result = grid
+            start = time.perf_counter()
+            for _ in range(generations):
+                result = simulate_func(result, threads)
+            timings.append(time.perf_counter() - start)
+            assert str(result) == str(expected)
+        locking_time, snapshot_time = timings
+        print(f'스레드 {threads:>2}개: LockingGrid {locking_time:.3f}초, '
+              f'SnapshotGrid {snapshot_time:.3f}초')
+
+# ======================================================================================================================
+if __name__ == "__main__":
+    for mtd in [
+        use_simulate_multiprocess,
+        compare_simulate_multiprocess,
+        use_simulate_batched,
+        compare_simulate_batched,
+        use_simulate_pool_bands,
+        compare_simulate_pool_bands,
+        use_simulate_pipeline_batched,
+        compare_simulate_pipeline_batched,
+        use_simulate_snapshot_threaded,
+        compare_simulate_snapshot_threaded,
+    ]:
+        mtd()
+        print('==================================================================')
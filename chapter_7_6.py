@@ -0,0 +1,569 @@
+# ======================================================================================================================
+# 생명 게임의 결과를 출력하고 저장하는 비용도 줄여라.
+# chapter_7_3 ~ chapter_7_5에서 세대를 계산하는 속도를 높이고 나면 결과를 화면에 찍거나 파일로 남기는 부분이 가장 느려진다.
+# better way 56의 ColumnPrinter와 Grid.__str__은 예제를 짧게 만들기 위한 코드라서 보드나 세대 수가 커지면 금방 한계에 부딪힌다.
+# ======================================================================================================================
+from collections import deque
+import io
+import time
+
+from chapter_7_3 import ALIVE, EMPTY, Grid, ColumnPrinter, PackedGrid
+from chapter_7_3 import game_logic, make_glider, simulate
+
+# ======================================================================================================================
+# 열마다 splitlines를 한 번만 호출하라
+# ColumnPrinter.__str__은 출력할 행마다 모든 열에 대해 data.splitlines()를 다시 호출한다. 행 수 x 열 수 x 보드 크기에 비례하므로
+# 200행 보드의 500 세대를 출력하면 출력 자체가 시뮬레이션보다 느려진다.
+# StreamingColumnPrinter는 append할 때 한 번만 행으로 나눠 저장하고, 출력할 행은 str.join으로 만든다.
+# write는 전체 문자열을 만들지 않고 한 행씩 파일에 쓴다. window를 지정하면 deque(maxlen=window)가 마지막 window개 세대만 남긴다.
+class StreamingColumnPrinter:
+    def __init__(self, window=None):
+        self.columns = deque(maxlen=window)
+        self.appended = 0
+
+    def append(self, data):
+        self.columns.append(data.splitlines())
+        self.appended += 1
+
+    # 첫 행은 열 번호다. window 때문에 앞의 열이 버려졌다면 번호는 버려진 개수만큼 건너뛴다.
+    def iter_rows(self):
+        first = self.appended - len(self.columns)
+        header = []
+        for i, lines in enumerate(self.columns, first):
+            padding = ' ' * (len(lines[0]) // 2 if lines else 0)
+            header.append(padding + str(i) + padding)
+        yield ' | '.join(header)
+
+        row_count = max((len(lines) for lines in self.columns), default=0)
+        for j in range(row_count):
+            yield ' | '.join(lines[j] for lines in self.columns)
+
+    def write(self, file):
+        for row in self.iter_rows():
+            file.write(row)
+            file.write('\n')
+
+    def __str__(self):
+        return '\n'.join(self.iter_rows())
+
+
+def use_streaming_column_printer():
+    import sys
+
+    grid = make_glider(Grid(5, 9))
+
+    columns = StreamingColumnPrinter(window=3)
+    for i in range(5):
+        columns.append(str(grid))
+        grid = simulate(grid)
+
+    columns.write(sys.stdout)  # 마지막 세 세대(2, 3, 4)만 출력된다
+
+
+def compare_streaming_column_printer(height=200, width=40, generations=200):
+    grid = make_glider(PackedGrid(height, width))
+    history = []
+    for _ in range(generations):
+        history.append(str(grid))
+        grid = simulate(grid)
+
+    for printer_class in (ColumnPrinter, StreamingColumnPrinter):
+        columns = printer_class()
+        for data in history:
+            columns.append(data)
+        start = time.perf_counter()
+        output = str(columns)
+        delta = time.perf_counter() - start
+        print(f'{printer_class.__name__}: {height}행 보드 {generations} 세대 출력 {delta:.3f}초')
+
+    streaming = StreamingColumnPrinter()
+    for data in history:
+        streaming.append(data)
+    assert output == str(streaming)
+    assert output + '\n' == stream_to_string(streaming)
+
+
+def stream_to_string(columns):
+    buffer = io.StringIO()
+    columns.write(buffer)
+    return buffer.getvalue()
+
+# ======================================================================================================================
+# 보드는 비트 단위 바이너리나 RLE로 저장하고, 큰 파일은 mmap으로 열어라
+# 지금은 str(grid)로 만든 문자열을 저장하는 방법밖에 없다. 셀 하나가 1바이트(줄바꿈 포함)를 차지하고 Grid.__str__은 +=로 문자열을
+# 이어 붙이므로 저장도 느리다. 여기서는 두 가지 형식을 제공한다.
+# 1. 바이너리: 헤더(매직 값, 높이, 너비) 뒤에 행마다 (width + 7) // 8 바이트를 쓴다. x 번째 셀은 x // 8 번째 바이트의 x % 8 번째 비트다.
+#    이 배치는 int.from_bytes(row, 'little')과 같아서 PackedGrid의 행 int로 바로 바꿀 수 있다.
+# 2. RLE: 생명 게임 프로그램들이 널리 사용하는 텍스트 형식이다. 'o'는 살아 있는 셀, 'b'는 빈 셀, '$'는 줄바꿈, '!'는 끝을 뜻하고
+#    앞에 붙은 숫자는 반복 횟수다.
+# 바이너리 파일을 읽을 때는 mmap으로 파일을 메모리에 매핑한다. 운영체제가 실제로 접근한 페이지만 읽어 오므로 1GB 보드라도 파일 전체를
+# 읽지 않고 바로 열 수 있다.
+from itertools import groupby
+import mmap
+import os
+import re
+import struct
+
+HEADER = struct.Struct('<4sII')
+MAGIC = b'LIFE'
+
+
+def row_bytes(width):
+    return (width + 7) // 8
+
+
+ROW_BITS = str.maketrans({ALIVE: '1', EMPTY: '0'})
+
+
+def row_to_int(grid, y):
+    if isinstance(grid, PackedGrid):
+        return grid.rows[y]
+    if isinstance(grid, Grid):
+        return int(''.join(reversed(grid.rows[y])).translate(ROW_BITS), 2)
+    bits = ''.join('1' if grid.get(y, x) == ALIVE else '0'
+                   for x in reversed(range(grid.width)))
+    return int(bits, 2)
+
+
+def save_grid(grid, path):
+    size = row_bytes(grid.width)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, grid.height, grid.width))
+        for y in range(grid.height):
+            f.write(row_to_int(grid, y).to_bytes(size, 'little'))
+
+
+# 읽기 전용 mmap 위에서 동작하는 Grid다. get은 필요한 바이트 하나만 읽는다.
+# 다음 세대를 계산하려면 simulate가 PackedGrid로 바꿔서 계산한다.
+class MappedGrid:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:  # 빈 파일은 mmap으로 매핑할 수도 없다
+                raise ValueError(f'헤더가 잘린 파일입니다({size}바이트): {path}')
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.height, self.width = HEADER.unpack_from(self.map)
+            if magic != MAGIC:
+                raise ValueError(f'생명 게임 바이너리 파일이 아닙니다: {path}')
+            self.row_size = row_bytes(self.width)
+            expected = HEADER.size + self.height * self.row_size
+            if len(self.map) != expected:
+                raise ValueError(f'{self.height}x{self.width} 보드는 {expected}바이트여야 하지만 '
+                                 f'파일은 {len(self.map)}바이트입니다: {path}')
+        except Exception:
+            self.map.close()
+            raise
+
+    def get(self, y, x):
+        y %= self.height
+        x %= self.width
+        byte = self.map[HEADER.size + y * self.row_size + x // 8]
+        if (byte >> (x % 8)) & 1:
+            return ALIVE
+        return EMPTY
+
+    def row(self, y):
+        start = HEADER.size + (y % self.height) * self.row_size
+        return int.from_bytes(self.map[start:start + self.row_size], 'little')
+
+    def to_packed(self):
+        grid = PackedGrid(self.height, self.width)
+        for y in range(self.height):
+            grid.rows[y] = self.row(y)
+        return grid
+
+    def __str__(self):
+        return str(self.to_packed())
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@simulate.register(MappedGrid)
+def simulate_mapped(grid, logic=game_logic):
+    return simulate(grid.to_packed(), logic)
+
+
+def load_grid(path):
+    return MappedGrid(path)
+
+
+def encode_rle_row(grid, y):
+    cells = (grid.get(y, x) for x in range(grid.width))
+    tokens = []
+    for state, group in groupby(cells):
+        tokens.append((len(list(group)), 'o' if state == ALIVE else 'b'))
+    if tokens and tokens[-1][1] == 'b':
+        tokens.pop()  # 행 끝의 빈 셀은 생략할 수 있다
+    return tokens
+
+
+def save_rle(grid, path, line_length=70):
+    tokens = []
+    newlines = 0
+    for y in range(grid.height):
+        if y:
+            newlines += 1
+        row_tokens = encode_rle_row(grid, y)
+        if row_tokens:
+            if newlines:
+                tokens.append((newlines, '$'))
+                newlines = 0
+            tokens.extend(row_tokens)
+    tokens.append((1, '!'))
+
+    lines = []
+    line = ''
+    for count, tag in tokens:
+        token = f'{count}{tag}' if count > 1 else tag
+        if len(line) + len(token) > line_length:
+            lines.append(line)
+            line = ''
+        line += token
+    lines.append(line)
+
+    with open(path, 'w') as f:
+        f.write(f'x = {grid.width}, y = {grid.height}, rule = B3/S23\n')
+        f.write('\n'.join(lines))
+        f.write('\n')
+
+
+RLE_HEADER = re.compile(r'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)')
+RLE_TOKEN = re.compile(r'(\d*)([a-zA-Z$!])')
+
+
+def load_rle(path, grid_class=Grid):
+    with open(path) as f:
+        lines = [line.strip() for line in f if not line.startswith('#')]
+
+    match = RLE_HEADER.match(lines[0]) if lines else None
+    if match is None:
+        raise ValueError(f'RLE 헤더가 없습니다: {path}')
+    width, height = int(match.group(1)), int(match.group(2))
+    grid = grid_class(height, width)
+
+    y = x = 0
+    for count, tag in RLE_TOKEN.findall(''.join(lines[1:])):
+        count = int(count) if count else 1
+        if tag == '!':
+            break
+        elif tag == '$':
+            y += count
+            x = 0
+        elif tag == 'b':
+            x += count
+        else:
+            for _ in range(count):
+                grid.set(y, x, ALIVE)
+                x += 1
+    return grid
+
+
+def save_text(grid, path):
+    with open(path, 'w') as f:
+        f.write(str(grid))
+
+
+def load_text(path):
+    with open(path) as f:
+        lines = f.read().splitlines()
+    if not lines:
+        raise ValueError(f'빈 파일입니다: {path}')
+    grid = Grid(len(lines), len(lines[0]))
+    for y, line in enumerate(lines):
+        grid.rows[y] = list(line)
+    return grid
+
+
+def use_save_load(path='glider'):
+    grid = make_glider(Grid(5, 9))
+
+    save_grid(grid, path + '.bin')
+    save_rle(grid, path + '.rle')
+    with open(path + '.rle') as f:
+        print(f.read())
+
+    columns = StreamingColumnPrinter()
+    columns.append(str(grid))
+    with load_grid(path + '.bin') as mapped:
+        columns.append(str(mapped))
+    columns.append(str(load_rle(path + '.rle')))
+    print(columns)
+
+    os.remove(path + '.bin')
+    os.remove(path + '.rle')
+
+
+# str(grid) 형식과 저장, 불러오기 시간, 파일 크기를 비교한다. 비교를 위해 보드의 1/4 정도를 무작위로 채운다.
+def compare_save_load(size=1024, path='board'):
+    import random
+
+    grid = PackedGrid(size, size)
+    for y in range(size):
+        grid.rows[y] = random.getrandbits(size) & random.getrandbits(size)
+    text = str(grid)
+
+    formats = [
+        ('str(grid)', path + '.txt', save_text, load_text),
+        ('바이너리', path + '.bin', save_grid, load_grid),
+        ('RLE', path + '.rle', save_rle, load_rle),
+    ]
+    for name, filename, save, load in formats:
+        start = time.perf_counter()
+        save(grid, filename)
+        save_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = load(filename)
+        load_time = time.perf_counter() - start
+
+        assert str(loaded) == text
+        if isinstance(loaded, MappedGrid):
+            loaded.close()
+        file_size = os.path.getsize(filename)
+        os.remove(filename)
+        print(f'{name}: 저장 {save_time:.3f}초, 불러오기 {load_time:.4f}초, '
+              f'크기 {file_size / 1024:,.0f}KB')
+
+# ======================================================================================================================
+# 긴 시뮬레이션의 기록은 키프레임과 변경분(delta)으로 저장하라
+# 모든 세대를 다시 재생하거나 중간부터 이어서 실행하려면 세대마다 보드를 저장해야 한다. chapter_8의 GameState처럼 세대마다
+# Grid 전체를 피클링하면 셀 하나가 문자열 원소 하나이므로 저장 크기와 시간이 세대 수 x 보드 크기만큼 커진다.
+# CheckpointWriter는 keyframe_interval 세대마다 보드 전체(키프레임)를 바이너리 형식의 행으로 저장하고, 그 사이 세대는
+# 이전 세대와 XOR한 결과가 0이 아닌 행만 (행 번호, XOR 값)으로 저장한다. 글라이더처럼 일부만 바뀌는 보드라면 세대당 몇 바이트면 된다.
+# 파일에는 레코드를 뒤에 덧붙이기만 하므로 실행이 중간에 끊겨도 그 전까지의 기록은 남는다. 같은 경로로 다시 열면 마지막 세대부터 이어서 쓴다.
+# CheckpointReader는 처음 열 때 레코드 헤더만 읽으며 건너뛰어 키프레임 색인을 만든다. read(generation)은 그 세대 이전의 가장 가까운
+# 키프레임부터 변경분을 최대 keyframe_interval - 1개만 적용하므로 기록이 아무리 길어도 시간이 일정하다.
+from bisect import bisect_right
+
+CHECKPOINT_HEADER = struct.Struct('<4sIII')
+CHECKPOINT_MAGIC = b'LIFH'
+RECORD = struct.Struct('<cII')  # 종류, 세대, 페이로드 길이
+KEYFRAME = b'K'
+DELTA = b'D'
+ROW_INDEX = struct.Struct('<I')
+
+
+class CheckpointWriter:
+    def __init__(self, path, height, width, keyframe_interval=64):
+        self.path = path
+        self.height = height
+        self.width = width
+        self.keyframe_interval = keyframe_interval
+        self.row_size = row_bytes(width)
+        self.generation = 0
+        self.previous = None
+
+        if os.path.exists(path) and os.path.getsize(path):
+            self.resume()
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(CHECKPOINT_HEADER.pack(
+                CHECKPOINT_MAGIC, height, width, keyframe_interval))
+
+    # 기존 기록의 마지막 세대를 복원하고, 쓰다 만 레코드가 있으면 잘라낸다.
+    def resume(self):
+        with CheckpointReader(self.path) as reader:
+            if (reader.height, reader.width) != (self.height, self.width):
+                raise ValueError(f'보드 크기가 기존 기록과 다릅니다: {self.path}')
+            self.keyframe_interval = reader.keyframe_interval
+            self.generation = len(reader)
+            if self.generation:
+                self.previous = reader.read(self.generation - 1).rows
+            end = reader.end
+        self.file = open(self.path, 'r+b')
+        self.file.truncate(end)
+        self.file.seek(end)
+
+    def append(self, grid):
+        rows = [row_to_int(grid, y) for y in range(self.height)]
+        if self.previous is None or self.generation % self.keyframe_interval == 0:
+            kind = KEYFRAME
+            payload = b''.join(row.to_bytes(self.row_size, 'little') for row in rows)
+        else:
+            kind = DELTA
+            parts = []
+            for y, (before, after) in enumerate(zip(self.previous, rows)):
+                if before != after:
+                    parts.append(ROW_INDEX.pack(y))
+                    parts.append((before ^ after).to_bytes(self.row_size, 'little'))
+            payload = b''.join(parts)
+        self.file.write(RECORD.pack(kind, self.generation, len(payload)))
+        self.file.write(payload)
+        self.previous = rows
+        self.generation += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CheckpointReader:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        header = self.file.read(CHECKPOINT_HEADER.size)
+        if len(header) < CHECKPOINT_HEADER.size:
+            self.file.close()
+            raise ValueError(f'체크포인트 파일이 아닙니다: {path}')
+        magic, self.height, self.width, self.keyframe_interval = (
+            CHECKPOINT_HEADER.unpack(header))
+        if magic != CHECKPOINT_MAGIC:
+            self.file.close()
+            raise ValueError(f'체크포인트 파일이 아닙니다: {path}')
+        self.row_size = row_bytes(self.width)
+        self.build_index()
+
+    # offsets[generation]은 그 세대 레코드의 페이로드 위치와 길이다. 끝이 잘린 레코드는 무시한다.
+    def build_index(self):
+        self.offsets = []
+        self.keyframes = []
+        size = os.fstat(self.file.fileno()).st_size
+        position = CHECKPOINT_HEADER.size
+        while position + RECORD.size <= size:
+            self.file.seek(position)
+            kind, generation, length = RECORD.unpack(self.file.read(RECORD.size))
+            start = position + RECORD.size
+            if start + length > size or generation != len(self.offsets):
+                break
+            if kind == KEYFRAME:
+                self.keyframes.append(generation)
+            self.offsets.append((kind, start, length))
+            position = start + length
+        self.end = position
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def payload(self, generation):
+        kind, start, length = self.offsets[generation]
+        self.file.seek(start)
+        return kind, self.file.read(length)
+
+    def apply(self, rows, kind, payload):
+        size = self.row_size
+        if kind == KEYFRAME:
+            return [int.from_bytes(payload[i:i + size], 'little')
+                    for i in range(0, len(payload), size)]
+        step = ROW_INDEX.size + size
+        for i in range(0, len(payload), step):
+            (y,) = ROW_INDEX.unpack_from(payload, i)
+            rows[y] ^= int.from_bytes(payload[i + ROW_INDEX.size:i + step], 'little')
+        return rows
+
+    def to_grid(self, rows):
+        grid = PackedGrid(self.height, self.width)
+        grid.rows = list(rows)
+        return grid
+
+    def read(self, generation):
+        if not 0 <= generation < len(self):
+            raise IndexError(f'기록에 없는 세대입니다: {generation}')
+        keyframe = self.keyframes[bisect_right(self.keyframes, generation) - 1]
+        rows = None
+        for g in range(keyframe, generation + 1):
+            rows = self.apply(rows, *self.payload(g))
+        return self.to_grid(rows)
+
+    # 처음부터 순서대로 재생할 때는 이전 세대에 변경분을 이어서 적용한다.
+    def __iter__(self):
+        rows = None
+        for generation in range(len(self)):
+            rows = self.apply(rows, *self.payload(generation))
+            yield self.to_grid(rows)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def use_checkpoint(path='glider.life'):
+    grid = make_glider(Grid(5, 9))
+
+    with CheckpointWriter(path, grid.height, grid.width, keyframe_interval=4) as writer:
+        for _ in range(3):
+            writer.append(grid)
+            grid = simulate(grid)
+
+    # 다시 열면 이어서 기록한다
+    with CheckpointWriter(path, grid.height, grid.width) as writer:
+        for _ in range(7):
+            writer.append(grid)
+            grid = simulate(grid)
+
+    columns = StreamingColumnPrinter()
+    with CheckpointReader(path) as reader:
+        for generation in (0, 3, 9):  # 열 번호 0, 1, 2가 각각 0, 3, 9 세대다
+            columns.append(str(reader.read(generation)))
+    print(columns)
+
+    os.remove(path)
+
+
+# chapter_8의 GameState처럼 세대마다 Grid를 피클링하는 방식과 파일 크기, 저장 시간, 임의의 세대를 읽는 시간을 비교한다.
+def compare_checkpoint(size=256, generations=500, path='history'):
+    import pickle
+
+    grids = [make_glider(Grid(size, size))]
+    packed = make_glider(PackedGrid(size, size))
+    for _ in range(generations - 1):
+        packed = simulate(packed)
+        grid = Grid(size, size)
+        for y in range(size):
+            for x in range(size):
+                grid.set(y, x, packed.get(y, x))
+        grids.append(grid)
+
+    start = time.perf_counter()
+    with open(path + '.pickle', 'wb') as f:
+        for grid in grids:
+            pickle.dump(grid, f)
+    pickle_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with CheckpointWriter(path + '.life', size, size) as writer:
+        for grid in grids:
+            writer.append(grid)
+    checkpoint_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with CheckpointReader(path + '.life') as reader:
+        target = generations - 2
+        assert str(reader.read(target)) == str(grids[target])
+    seek_time = time.perf_counter() - start
+
+    for name, filename, delta in [('pickle', path + '.pickle', pickle_time),
+                                  ('체크포인트', path + '.life', checkpoint_time)]:
+        file_size = os.path.getsize(filename)
+        os.remove(filename)
+        print(f'{name}: {generations} 세대 저장 {delta:.3f}초, 크기 {file_size / 1024:,.0f}KB')
+    print(f'체크포인트 {target} 세대 읽기: {seek_time:.4f}초')
+
+# ======================================================================================================================
+if __name__ == "__main__":
+    for mtd in [
+        use_streaming_column_printer,
+        compare_streaming_column_printer,
+        use_save_load,
+        compare_save_load,
+        use_checkpoint,
+        compare_checkpoint,
+    ]:
+        mtd()
+        print('==================================================================')
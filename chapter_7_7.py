@@ -0,0 +1,431 @@
+# ======================================================================================================================
+# 동시성 방식을 고르기 전에 같은 조건에서 측정하라.
+# better way 56~60에는 생명 게임 simulate가 여섯 가지 있다. 순차 실행(56), 셀마다 스레드(57), Queue 파이프라인(58),
+# ThreadPoolExecutor(59), 코루틴(60), count_neighbors에서도 I/O를 하는 코루틴(60)이다. 책은 각 방식의 장단점을 설명하지만
+# 같은 보드 크기와 같은 I/O 지연 시간에서 나란히 측정한 적은 없다.
+
+# run_benchmark는 각 방식을 32x32부터 2048x2048까지의 보드에서 실행하고, game_logic에 인위적인 I/O 지연(latency)을 넣을 수 있다.
+# 큰 보드에서 메모리나 시간이 지나치게 드는 방식은 MAX_SIZE까지만 측정한다.
+# 측정 하나마다 새 프로세스를 띄워서 실행하므로 최대 RSS(resident set size)가 이전 측정의 영향을 받지 않는다.
+# 결과는 초당 셀 수, 최대 RSS, chapter_8_2의 print_delta와 같은 방식의 증가 비율로 출력하고, 회귀를 추적할 수 있도록 JSON으로도 저장한다.
+# ======================================================================================================================
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import json
+import os
+import resource
+import time
+
+from chapter_7_3 import Grid, game_logic, make_glider, simulate
+from chapter_7_5 import game_logic_async, game_logic_thread, run_pipeline
+from chapter_7_5 import simulate_async, simulate_async_io, simulate_pipeline
+from chapter_7_5 import simulate_pool, simulate_threaded
+
+
+# time.sleep과 asyncio.sleep으로 블로킹 I/O와 비동기 I/O를 흉내 낸다.
+def make_logic(latency):
+    if not latency:
+        return game_logic
+
+    def logic(state, neighbors):
+        time.sleep(latency)
+        return game_logic(state, neighbors)
+
+    return logic
+
+
+def make_logic_async(latency):
+    if not latency:
+        return game_logic_async
+
+    async def logic(state, neighbors):
+        await asyncio.sleep(latency)
+        return game_logic(state, neighbors)
+
+    return logic
+
+
+def run_serial(grid, generations, latency, metrics=None):
+    logic = make_logic(latency)
+    step = simulate
+    if metrics is not None:
+        if type(grid) is Grid:
+            step = partial(simulate_profiled, metrics=metrics)
+        else:
+            logic = instrument(logic, metrics)
+        step = timed(step, metrics)
+    for _ in range(generations):
+        grid = step(grid, logic)
+    return grid
+
+
+def run_threaded(grid, generations, latency, metrics=None):
+    logic = instrument(make_logic(latency), metrics)
+    step = timed(simulate_threaded, metrics)
+    for _ in range(generations):
+        grid = step(grid, logic)
+    return grid
+
+
+def run_queue_pipeline(grid, generations, latency, metrics=None):
+    func = partial(game_logic_thread, logic=instrument(make_logic(latency), metrics))
+    queue_class = ClosableQueue
+    if metrics is not None:
+        queue_class = partial(TimedQueue, metrics)
+    return run_pipeline(grid, generations, func, timed(simulate_pipeline, metrics),
+                        queue_class=queue_class)
+
+
+def run_pool(grid, generations, latency, metrics=None):
+    logic = instrument(make_logic(latency), metrics)
+    step = timed(simulate_pool, metrics, grid_index=1)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        for _ in range(generations):
+            grid = step(pool, grid, logic)
+    return grid
+
+
+def step_async(grid, logic):
+    return asyncio.run(simulate_async(grid, logic))
+
+
+def step_async_io(grid, logic):
+    return asyncio.run(simulate_async_io(grid, logic))
+
+
+def run_async(grid, generations, latency, metrics=None):
+    logic = instrument_async(make_logic_async(latency), metrics)
+    step = timed(step_async, metrics)
+    for _ in range(generations):
+        grid = step(grid, logic)
+    return grid
+
+
+def run_async_io(grid, generations, latency, metrics=None):
+    logic = instrument_async(make_logic_async(latency), metrics)
+    step = timed(step_async_io, metrics)
+    for _ in range(generations):
+        grid = step(grid, logic)
+    return grid
+
+
+VARIANTS = {
+    'serial': run_serial,
+    'threaded': run_threaded,
+    'pipeline': run_queue_pipeline,
+    'pool': run_pool,
+    'async': run_async,
+    'async_io': run_async_io,
+}
+
+# 셀마다 스레드를 만드는 방식은 큰 보드에서 스레드를 수백만 개 만들게 되므로 이 크기까지만 측정한다.
+# 셀마다 Future나 코루틴을 만드는 방식은 셀당 1KB가 넘게 들어서(256x256에서 pool 126MB, async 88MB) 2048x2048이면 4GB를 넘는다.
+# Queue 파이프라인은 메모리는 적게 쓰지만 2048x2048 한 세대에 20초가 넘게 걸린다.
+MAX_SIZE = {
+    'threaded': 128,
+    'pool': 512,
+    'async': 512,
+    'async_io': 512,
+    'pipeline': 1024,
+}
+
+SIZES = (32, 64, 128, 256, 512, 1024, 2048)
+
+
+# 자식 프로세스에서 실행된다. ru_maxrss는 리눅스에서 KB 단위다.
+# profile이 참이면 SimulationMetrics의 요약도 결과에 넣는다.
+def measure(name, size, generations, latency, profile=False):
+    grid = make_glider(Grid(size, size))
+    metrics = SimulationMetrics() if profile else None
+    start = time.perf_counter()
+    VARIANTS[name](grid, generations, latency, metrics)
+    delta = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = {
+        'variant': name,
+        'size': size,
+        'cells': size * size,
+        'generations': generations,
+        'latency': latency,
+        'seconds': delta,
+        'cells_per_second': size * size * generations / delta,
+        'peak_rss_kb': peak_rss,
+    }
+    if metrics is not None:
+        result['metrics'] = metrics.summary()
+    return result
+
+
+def measure_in_process(name, size, generations, latency, profile=False):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(
+            measure, name, size, generations, latency, profile).result()
+
+
+def print_delta(before, after):
+    before_count, before_time = before
+    after_count, after_time = after
+    growth = 1 + (after_count - before_count) / before_count
+    slowdown = 1 + (after_time - before_time) / before_time
+    print(f'데이터 크기 {growth:>4.1f}배, 걸린 시간 {slowdown:>4.1f}배')
+
+
+def run_benchmark(variants=tuple(VARIANTS), sizes=SIZES, generations=1,
+                  latency=0.0, path=None, profile=False):
+    results = []
+    for name in variants:
+        print(f'== {name} (I/O 지연 {latency}초)')
+        baseline = None
+        for size in sizes:
+            if size > MAX_SIZE.get(name, size):
+                print(f'{size}x{size}: 건너뜀')
+                continue
+            result = measure_in_process(name, size, generations, latency, profile)
+            results.append(result)
+            print(f'{size}x{size}: {result["seconds"]:.3f}초, '
+                  f'초당 {result["cells_per_second"]:,.0f}셀, '
+                  f'최대 RSS {result["peak_rss_kb"] / 1024:,.1f}MB')
+
+            comparison = (result['cells'], result['seconds'])
+            if baseline is None:
+                baseline = comparison
+            else:
+                print_delta(baseline, comparison)
+
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+def use_benchmark(path='simulate_benchmark.json'):
+    run_benchmark(sizes=(32, 64, 128), path=path)
+    with open(path) as f:
+        print(f'{len(json.load(f))}개의 측정 결과를 {path}에 저장했습니다')
+    os.remove(path)
+
+
+# I/O가 느려지면 순차 실행은 셀 수 x 지연 시간만큼 느려지지만, 코루틴은 거의 영향을 받지 않는다.
+def use_benchmark_with_latency():
+    run_benchmark(variants=('serial', 'pool', 'async'), sizes=(16, 32),
+                  latency=0.001)
+
+# ======================================================================================================================
+# 세대마다 어디에 시간이 쓰이는지 기록하라
+# 지금은 simulate가 어디서 시간을 쓰는지 보려면 chapter_8_1에서 insertion_sort를 측정한 것처럼 cProfile로 직접 감싸야 한다.
+# cProfile은 모든 함수 호출을 기록하므로 측정 대상이 훨씬 느려지고, 세대별 시간이나 초당 셀 수 같은 지표는 따로 계산해야 한다.
+# 모든 run_* 함수는 metrics 인자로 SimulationMetrics를 받는다. 기록하는 항목은 다음과 같다.
+# - 모든 방식: 세대마다 걸린 시간과 초당 셀 수
+# - 순차 실행(Grid): 이웃 수 세기(count), 규칙 계산(rule), 다음 세대 보드에 쓰기(write)에 걸린 시간
+# - 나머지 방식: 규칙 계산(rule)에 걸린 시간. 여러 스레드나 코루틴의 시간을 더한 값이므로 세대 시간보다 클 수 있다
+# - Queue 파이프라인: 원소가 in_queue와 out_queue에 들어가서 꺼내지기까지 기다린 시간(queue_wait)
+# 각 단계의 시간은 호출마다 잰 시간의 합이고, calls에 호출 횟수가 함께 기록되므로 평균도 구할 수 있다.
+# metrics가 None이면 run_* 함수는 측정 코드가 전혀 없는 원래 함수를 그대로 호출하므로 부가 비용이 없다.
+# on_generation 콜백을 넘기면 세대가 끝날 때마다 그 세대의 기록(딕셔너리)을 받을 수 있다.
+from collections import defaultdict
+from threading import Lock
+
+from chapter_7_3 import count_neighbors
+from chapter_7_5 import ClosableQueue
+
+
+class SimulationMetrics:
+    def __init__(self, on_generation=None):
+        self.on_generation = on_generation
+        self.records = []
+        self.phases = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.lock = Lock()
+
+    # 여러 스레드에서 동시에 호출될 수 있다.
+    def add(self, phase, seconds, calls=1):
+        with self.lock:
+            self.phases[phase] += seconds
+            self.calls[phase] += calls
+
+    def record(self, cells, seconds):
+        with self.lock:
+            phases = dict(self.phases)
+            calls = dict(self.calls)
+            self.phases.clear()
+            self.calls.clear()
+        record = {
+            'generation': len(self.records),
+            'cells': cells,
+            'seconds': seconds,
+            'cells_per_second': cells / seconds if seconds else 0.0,
+            'phases': phases,
+            'calls': calls,
+        }
+        self.records.append(record)
+        if self.on_generation is not None:
+            self.on_generation(record)
+
+    def summary(self):
+        seconds = sum(record['seconds'] for record in self.records)
+        cells = sum(record['cells'] for record in self.records)
+        phases = defaultdict(float)
+        calls = defaultdict(int)
+        for record in self.records:
+            for phase, delta in record['phases'].items():
+                phases[phase] += delta
+                calls[phase] += record['calls'][phase]
+        return {
+            'generations': len(self.records),
+            'seconds': seconds,
+            'cells_per_second': cells / seconds if seconds else 0.0,
+            'phases': dict(phases),
+            'calls': dict(calls),
+        }
+
+    def to_dict(self):
+        return {'summary': self.summary(), 'generations': self.records}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+# 한 세대를 진행하는 함수를 감싸서 세대 시간을 기록한다. grid_index는 보드가 몇 번째 인자인지 나타낸다.
+def timed(step, metrics, grid_index=0):
+    if metrics is None:
+        return step
+
+    def wrapper(*args):
+        grid = args[grid_index]
+        start = time.perf_counter()
+        result = step(*args)
+        metrics.record(grid.height * grid.width, time.perf_counter() - start)
+        return result
+
+    return wrapper
+
+
+def instrument(logic, metrics, phase='rule'):
+    if metrics is None:
+        return logic
+
+    def wrapper(state, neighbors):
+        start = time.perf_counter()
+        try:
+            return logic(state, neighbors)
+        finally:
+            metrics.add(phase, time.perf_counter() - start)
+
+    return wrapper
+
+
+def instrument_async(logic, metrics, phase='rule'):
+    if metrics is None:
+        return logic
+
+    async def wrapper(state, neighbors):
+        start = time.perf_counter()
+        try:
+            return await logic(state, neighbors)
+        finally:
+            metrics.add(phase, time.perf_counter() - start)
+
+    return wrapper
+
+
+# simulate와 같은 일을 하지만 step_cell의 세 단계를 따로 잰다. perf_counter 호출 비용은 셀마다 지역 변수에 더하고,
+# 세대가 끝날 때 한 번만 metrics에 넘긴다.
+def simulate_profiled(grid, logic=game_logic, metrics=None):
+    clock = time.perf_counter
+    count_time = rule_time = write_time = 0.0
+    next_grid = Grid(grid.height, grid.width)
+    for y in range(grid.height):
+        for x in range(grid.width):
+            start = clock()
+            state = grid.get(y, x)
+            neighbors = count_neighbors(y, x, grid.get)
+            counted = clock()
+            next_state = logic(state, neighbors)
+            ruled = clock()
+            next_grid.set(y, x, next_state)
+            written = clock()
+            count_time += counted - start
+            rule_time += ruled - counted
+            write_time += written - ruled
+    cells = grid.height * grid.width
+    metrics.add('count', count_time, cells)
+    metrics.add('rule', rule_time, cells)
+    metrics.add('write', write_time, cells)
+    return next_grid
+
+
+# 원소를 넣은 시각을 함께 저장했다가, 꺼낼 때 기다린 시간을 기록한다. 종료 신호(SENTINEL)는 기록하지 않는다.
+class TimedQueue(ClosableQueue):
+    def __init__(self, metrics, phase='queue_wait'):
+        super().__init__()
+        self.metrics = metrics
+        self.phase = phase
+
+    def put(self, item, block=True, timeout=None):
+        super().put((time.perf_counter(), item), block, timeout)
+
+    def get(self, block=True, timeout=None):
+        put_time, item = super().get(block, timeout)
+        if item is not self.SENTINEL:
+            self.metrics.add(self.phase, time.perf_counter() - put_time)
+        return item
+
+
+def use_simulation_metrics(path='simulate_metrics.json'):
+    def print_generation(record):
+        phases = ', '.join(
+            f'{name} 합계 {delta:.3f}초 평균 {delta / record["calls"][name] * 1e6:,.1f}us'
+            for name, delta in sorted(record['phases'].items()))
+        print(f'{record["generation"]} 세대: {record["seconds"]:.3f}초, '
+              f'초당 {record["cells_per_second"]:,.0f}셀 ({phases})')
+
+    for name in ('serial', 'pipeline'):
+        print(f'== {name}')
+        metrics = SimulationMetrics(on_generation=print_generation)
+        VARIANTS[name](make_glider(Grid(64, 64)), 3, 0.0, metrics)
+
+    metrics.dump(path)
+    os.remove(path)
+
+
+# metrics를 넘기지 않으면 simulate를 직접 호출하는 반복문과 시간이 같아야 한다.
+def compare_simulation_metrics(size=128, generations=5, repeat=5):
+    grid = make_glider(Grid(size, size))
+
+    def plain():
+        result = grid
+        for _ in range(generations):
+            result = simulate(result)
+
+    def disabled():
+        run_serial(grid, generations, 0.0)
+
+    def enabled():
+        run_serial(grid, generations, 0.0, SimulationMetrics())
+
+    times = {}
+    for _ in range(repeat):  # 순서의 영향을 줄이려고 번갈아 실행하고 가장 빠른 시간을 사용한다
+        for name, func in (('simulate', plain), ('metrics=None', disabled),
+                           ('SimulationMetrics', enabled)):
+            start = time.perf_counter()
+            func()
+            delta = time.perf_counter() - start
+            times[name] = min(delta, times.get(name, delta))
+
+    for name, delta in times.items():
+        overhead = (delta - times['simulate']) / times['simulate']
+        print(f'{name}: {delta:.3f}초 ({overhead:+.1%})')
+
+# ======================================================================================================================
+if __name__ == "__main__":
+    for mtd in [
+        use_benchmark,
+        use_benchmark_with_latency,
+        use_simulation_metrics,
+        compare_simulation_metrics,
+    ]:
+        mtd()
+        print('==================================================================')
@@ -0,0 +1,231 @@
+# ======================================================================================================================
+# 셀마다 I/O를 보내지 말고 한 세대의 요청을 묶어서 보내라.
+# better way 60의 game_logic 코루틴은 셀마다 await my_socket.recv(100)을 호출하도록 설계되어 있다. 즉 셀 하나당 네트워크 왕복이
+# 한 번씩 일어나므로 1000x1000 보드라면 한 세대에 왕복이 백만 번 필요하다. 코루틴 덕분에 왕복을 기다리는 동안 다른 셀을 진행할 수는
+# 있지만, 요청마다 붙는 헤더와 시스템 콜, 서버 쪽 처리 비용은 그대로 남는다.
+
+# CoalescingLogic은 game_logic 코루틴 대신 사용할 수 있는 요청 묶음(coalescing) 계층이다. 각 셀의 game_logic 호출은 요청을
+# 대기 목록에 넣고 퓨처(future)를 기다리기만 한다. 대기 목록이 max_batch_size에 도달하거나 첫 요청 뒤 flush_interval초가 지나면
+# 모인 요청을 한 번의 대량 요청으로 규칙 서비스에 보내고, 응답이 오면 각 퓨처에 결과를 넣어준다.
+# simulate_async는 한 세대의 모든 셀 코루틴을 gather로 한꺼번에 시작하므로 모든 셀이 첫 요청을 넣은 다음에야 타이머가 실행된다.
+# 따라서 한 세대의 왕복 수는 셀 수 / max_batch_size 정도로 줄어든다.
+
+# 실제 규칙 서비스 없이도 측정할 수 있도록 같은 이벤트 루프에서 실행되는 asyncio 서버(RuleServer)를 함께 제공한다.
+# 요청과 응답은 길이(4바이트) 뒤에 셀마다 1바이트가 붙는 형식이다. 요청 바이트는 (살아 있으면 0x10) | 이웃 수, 응답 바이트는
+# 다음 상태가 살아 있으면 1, 아니면 0이다.
+# ======================================================================================================================
+import asyncio
+import struct
+import time
+
+from chapter_7_3 import ALIVE, EMPTY, Grid, ColumnPrinter
+from chapter_7_3 import game_logic, make_glider, simulate
+from chapter_7_5 import simulate_async
+
+LENGTH = struct.Struct('<I')
+
+
+def encode_cell(state, neighbors):
+    return (0x10 if state == ALIVE else 0) | neighbors
+
+
+def decode_cell(value):
+    state = ALIVE if value & 0x10 else EMPTY
+    return state, value & 0x0F
+
+
+async def read_message(reader):
+    header = await reader.readexactly(LENGTH.size)
+    (size,) = LENGTH.unpack(header)
+    return await reader.readexactly(size)
+
+
+def write_message(writer, payload):
+    writer.write(LENGTH.pack(len(payload)))
+    writer.write(payload)
+
+
+class RuleServer:
+    def __init__(self, logic=game_logic):
+        self.logic = logic
+        self.requests = 0  # 받은 요청(왕복) 수
+        self.cells = 0  # 요청에 들어 있던 셀 수
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    payload = await read_message(reader)
+                except asyncio.IncompleteReadError:
+                    break  # 클라이언트가 연결을 닫았다
+                self.requests += 1
+                self.cells += len(payload)
+                response = bytearray(len(payload))
+                for i, value in enumerate(payload):
+                    if self.logic(*decode_cell(value)) == ALIVE:
+                        response[i] = 1
+                write_message(writer, bytes(response))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+# 연결 하나로 요청을 보내고 응답을 받는다. 응답에는 어느 요청에 대한 것인지 표시가 없으므로 Lock으로 왕복을 하나씩 진행한다.
+class RuleClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.round_trips = 0
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, payload):
+        async with self.lock:
+            write_message(self.writer, payload)
+            await self.writer.drain()
+            response = await read_message(self.reader)
+            self.round_trips += 1
+        if len(response) != len(payload):
+            raise ConnectionError(
+                f'응답 길이가 요청과 다릅니다: {len(response)} != {len(payload)}')
+        return response
+
+    # better way 60의 game_logic처럼 셀마다 왕복을 한 번씩 한다. 비교용으로 남겨둔다.
+    async def game_logic(self, state, neighbors):
+        response = await self.request(bytes([encode_cell(state, neighbors)]))
+        return ALIVE if response[0] else EMPTY
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+class CoalescingLogic:
+    def __init__(self, client, max_batch_size=4096, flush_interval=0.001):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.pending = bytearray()
+        self.futures = []
+        self.timer = None
+        self.sending = set()
+
+    # simulate_async 같은 코루틴 변형에 logic으로 넘긴다.
+    async def game_logic(self, state, neighbors):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(encode_cell(state, neighbors))
+        self.futures.append(future)
+        if len(self.futures) >= self.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, self.flush)
+        return await future
+
+    # 대기 중인 요청을 하나의 대량 요청으로 보낸다. 응답은 별도의 태스크가 기다린다.
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.futures:
+            return
+        payload = bytes(self.pending)
+        futures = self.futures
+        self.pending = bytearray()
+        self.futures = []
+        task = asyncio.get_running_loop().create_task(self.send(payload, futures))
+        self.sending.add(task)
+        task.add_done_callback(self.sending.discard)
+
+    async def send(self, payload, futures):
+        try:
+            response = await self.client.request(payload)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, value in zip(futures, response):
+            if not future.done():
+                future.set_result(ALIVE if value else EMPTY)
+
+    async def close(self):
+        self.flush()
+        if self.sending:
+            await asyncio.gather(*self.sending)
+
+
+async def run_remote(grid, generations, logic):
+    for _ in range(generations):
+        grid = await simulate_async(grid, logic)
+    return grid
+
+
+async def run_with_server(grid, generations, coalesce=True, **options):
+    server = RuleServer()
+    host, port = await server.start()
+    client = await RuleClient.connect(host, port)
+    try:
+        if coalesce:
+            coalescing = CoalescingLogic(client, **options)
+            grid = await run_remote(grid, generations, coalescing.game_logic)
+            await coalescing.close()
+        else:
+            grid = await run_remote(grid, generations, client.game_logic)
+    finally:
+        await client.close()
+        await server.close()
+    return grid, client.round_trips
+
+
+def use_coalescing_logic():
+    grid = make_glider(Grid(5, 9))
+
+    columns = ColumnPrinter()
+    for i in range(5):
+        columns.append(str(grid))
+        grid, round_trips = asyncio.run(run_with_server(grid, 1))
+
+    print(columns)
+    print(f'세대당 왕복: {round_trips}번')  # 셀 45개를 요청 한 번으로 보낸다
+
+
+def compare_coalescing_logic(size=64, generations=3):
+    grid = make_glider(Grid(size, size))
+    expected = grid
+    for _ in range(generations):
+        expected = simulate(expected)
+
+    for name, coalesce, options in [
+            ('셀마다 왕복', False, {}),
+            ('묶음 최대 256', True, {'max_batch_size': 256}),
+            ('묶음 최대 4096', True, {'max_batch_size': 4096})]:
+        start = time.perf_counter()
+        result, round_trips = asyncio.run(
+            run_with_server(grid, generations, coalesce, **options))
+        delta = time.perf_counter() - start
+        assert str(result) == str(expected)
+        print(f'{size}x{size} {generations} 세대 {name}: {delta:.3f}초, '
+              f'세대당 왕복 {round_trips / generations:,.0f}번')
+
+# ======================================================================================================================
+if __name__ == "__main__":
+    for mtd in [
+        use_coalescing_logic,
+        compare_coalescing_logic,
+    ]:
+        mtd()
+        print('==================================================================')